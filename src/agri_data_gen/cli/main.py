@@ -1,4 +1,5 @@
 import typer
+import asyncio
 from pathlib import Path
 from agri_data_gen.core.data_access.taxonomy_manager import TaxonomyManager
 from agri_data_gen.core.generators.generator import GenerationEngine
@@ -85,19 +86,32 @@ def pipeline_run(
     output_dir: str = "data/generated",
     bundle_filename: str = "bundles.jsonl",
     output_filename: str = "data.jsonl",
-    limit: int = None
+    limit: int = None,
+    stream: bool = typer.Option(False, help="Overlap bundle building with generation."),
+    refresh_taxonomy: bool = typer.Option(False, help="Ignore the cached taxonomy snapshot (needed after editing MongoDB outside load-taxonomies)."),
+    workers: int = typer.Option(1, help="Processes used to serialise bundles (non-streaming build only).")
 ):
     """
     Run the full end-to-end pipeline:
     taxonomies → bundles → generation
+
+    Bundle ids follow the builder's line order. If a rebuild reports a
+    bundle order change, clear generator .done files, classification
+    batches and data/cursor.txt before resuming from old state.
     """
 
     print("Starting end-to-end pipeline...")
 
+    if stream:
+        asyncio.run(_pipeline_run_async(bundle_dir, output_dir, bundle_filename,
+                                        output_filename, limit, refresh_taxonomy))
+        print("Pipeline completed successfully.")
+        return
+
     # Build bundles
     print("Building bundles...")
-    bundle_builder = BundleBuilder(out_dir=bundle_dir)
-    bundle_builder.load_all()
+    bundle_builder = BundleBuilder(out_dir=bundle_dir, workers=workers)
+    bundle_builder.load_all(refresh_taxonomy=refresh_taxonomy)
     generated_bundles_path = bundle_builder.build_all(filename= bundle_filename)
     
     print("Building system instruction bundles...")
@@ -121,6 +135,30 @@ def pipeline_run(
     # print("Pipeline completed successfully.")
 
 
+async def _pipeline_run_async(bundle_dir, output_dir, bundle_filename,
+                              output_filename, limit, refresh_taxonomy=False):
+    """
+    Streaming pipeline: bundles are fed to the generation engine as they are
+    built instead of after the whole file is written.
+    """
+    bundle_builder = BundleBuilder(out_dir=bundle_dir)
+    bundle_builder.load_all(refresh_taxonomy=refresh_taxonomy)
+
+    print("Building system instruction bundles...")
+    sys_instruction_builder = SystemInstructionBuilder()
+    sys_instruction_builder.build_instructions()
+
+    print("Building bundles and generating reasoning data...")
+    engine = GenerationEngine(
+            bundle_file=Path(bundle_dir) / bundle_filename,
+            out_file=Path(output_dir) / output_filename,
+            rpm_limit=4,
+            max_workers=1
+        )
+    await engine.generate_stream(bundle_builder.build_stream(filename=bundle_filename),
+                                 limit=limit)
+
+
 def main():
 
     app()
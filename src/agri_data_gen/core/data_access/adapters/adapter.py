@@ -33,7 +33,7 @@ class GenericAdapter:
         In a GenericAdapter, we don't load external CSVs/DBs, 
         but we log readiness to aid debugging.
         """
-        logger.info(f"[{self.group_name}] Adapter ready. Schema expects: {self.attributes}")
+        logger.info("[%s] Adapter ready. Schema expects: %s", self.group_name, self.attributes)
 
     def sample(self, entry_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -51,12 +51,14 @@ class GenericAdapter:
         
         # 1. Validation (Soft): Check if crucial attributes are missing
         # We don't crash, but we warn. This helps you spot bad YAML data.
-        missing_keys = [attr for attr in self.attributes if attr not in entry_data]
-        if missing_keys:
-            logger.warning(
-                f"[{self.group_name}] Entry '{entry_data.get('id', 'unknown')}' "
-                f"is missing expected attributes: {missing_keys}"
-            )
+        # Skipped entirely when warnings are filtered out.
+        if logger.isEnabledFor(logging.WARNING):
+            missing_keys = [attr for attr in self.attributes if attr not in entry_data]
+            if missing_keys:
+                logger.warning(
+                    "[%s] Entry '%s' is missing expected attributes: %s",
+                    self.group_name, entry_data.get('id', 'unknown'), missing_keys
+                )
 
         # 2. Cleanup: Ensure 'label' exists (critical for LLM human-readability)
         if "label" not in entry_data:
@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Callable, Dict
 from agri_data_gen.core.data_access.adapters.crop_adapter import CropAdapter
 from agri_data_gen.core.data_access.adapters.weather_adapter import WeatherAdapter
 
@@ -7,26 +7,31 @@ class AdapterRegistry:
     """
     Central registry. Allows BundleBuilder to dynamically
     pull sampler objects for each taxonomy group.
+    Adapters are built and loaded on first use, so commands that never
+    touch a dataset never parse its CSV.
     """
 
     def __init__(self):
-        self.adapters: Dict[str, object] = {}
+        self._factories: Dict[str, Callable[[], object]] = {}
+        self._instances: Dict[str, object] = {}
+        self.load_all()
 
     def load_all(self):
         """
-        Initialize adapters for groups we support.
+        Register factories for groups we support.
         Add soil_adapter, symptom_adapter etc. later.
         """
-        self.adapters = {
-            "crop": CropAdapter("data/raw/Crop_recommendation.csv"),
-            "weather": WeatherAdapter("data/raw/weather.csv")
+        self._factories = {
+            "crop": lambda: CropAdapter("data/raw/Crop_recommendation.csv"),
+            "weather": lambda: WeatherAdapter("data/raw/weather.csv")
         }
-
-        # Load all datasets now (important)
-        for adapter in self.adapters.values():
-            adapter.load()
+        self._instances = {}
 
     def get_adapter(self, group: str):
-        if group not in self.adapters:
-            raise KeyError(f"No adapter registered for group '{group}'")
-        return self.adapters[group]
+        if group not in self._instances:
+            if group not in self._factories:
+                raise KeyError(f"No adapter registered for group '{group}'")
+            adapter = self._factories[group]()
+            adapter.load()
+            self._instances[group] = adapter
+        return self._instances[group]
@@ -11,25 +11,53 @@ class CropAdapter(BaseAdapter):
     Now includes graceful fallback when the crop is missing.
     """
 
+    # Only the columns used downstream are parsed, with explicit dtypes
+    COLUMN_DTYPES = {
+        "label": "category",
+        "temperature": "float32",
+        "rainfall": "float32",
+        "ph": "float32",
+    }
+
     def __init__(self, csv_path: str = "data/raw/Crop_recommendation.csv"):
         self.csv_path = Path(csv_path)
         self.df = None
         self.crop_groups = {}
+        self.crop_stats = {}
 
     def load(self):
         if not self.csv_path.exists():
             raise FileNotFoundError(f"Crop dataset not found at {self.csv_path}")
 
-        self.df = pd.read_csv(self.csv_path)
-
-        required_cols = {"label", "temperature", "rainfall", "ph"}
-        if not required_cols.issubset(self.df.columns):
-            raise ValueError(f"Crop dataset missing required columns: {required_cols}")
+        required_cols = set(self.COLUMN_DTYPES)
+        try:
+            self.df = pd.read_csv(
+                self.csv_path,
+                usecols=list(self.COLUMN_DTYPES),
+                dtype=self.COLUMN_DTYPES,
+            )
+        except ValueError as e:
+            # only a usecols miss means missing columns; bad dtypes etc. pass through
+            missing = required_cols - set(pd.read_csv(self.csv_path, nrows=0).columns)
+            if not missing:
+                raise
+            raise ValueError(f"Crop dataset missing required columns: {missing}") from e
 
         # Group rows by crop name
         self.crop_groups = {
             crop: subdf.reset_index(drop=True)
-            for crop, subdf in self.df.groupby("label")
+            for crop, subdf in self.df.groupby("label", observed=True)
+        }
+
+        # Per-crop ranges computed once, so sample() is a dict lookup
+        stats = self.df.groupby("label", observed=True)[["temperature", "rainfall", "ph"]].agg(["min", "max"])
+        self.crop_stats = {
+            crop: {
+                "pH_preference_range": [float(row[("ph", "min")]), float(row[("ph", "max")])],
+                "rainfall_range_mm": [float(row[("rainfall", "min")]), float(row[("rainfall", "max")])],
+                "temperature_tolerance": [float(row[("temperature", "min")]), float(row[("temperature", "max")])],
+            }
+            for crop, row in stats.iterrows()
         }
 
     def get_all_ids(self) -> List[str]:
@@ -47,24 +75,8 @@ class CropAdapter(BaseAdapter):
         crop_name = entry_id.replace("crop_", "").replace("_", " ")
 
         # Case 1: crop exists in dataset → return real values
-        if crop_name in self.crop_groups:
-            sub = self.crop_groups[crop_name]
-
-            temp_min = float(sub["temperature"].min())
-            temp_max = float(sub["temperature"].max())
-
-            rain_min = float(sub["rainfall"].min())
-            rain_max = float(sub["rainfall"].max())
-
-            ph_min = float(sub["ph"].min())
-            ph_max = float(sub["ph"].max())
-
-            # return {
-            #     "crop_name": crop_name,
-            #     "pH_preference_range": [ph_min, ph_max],
-            #     "rainfall_range_mm": [rain_min, rain_max],
-            #     "temperature_tolerance": [temp_min, temp_max],
-            # }
+        if crop_name in self.crop_stats:
+            # return {"crop_name": crop_name, **self.crop_stats[crop_name]}
             return {
                 "crop_name": crop_name,
                 "pH_preference_range": None,
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from typing import List, Dict, Any
@@ -12,51 +13,70 @@ class WeatherAdapter(BaseAdapter):
     Implements Option A thresholds for bucket classification.
     """
 
+    # Only the columns used downstream are parsed, with explicit dtypes
+    COLUMN_DTYPES = {
+        "temperature_celsius": "float32",
+        "humidity": "float32",
+        "precip_mm": "float32",
+        "wind_kph": "float32",
+        "location_name": "category",
+        "region": "category",
+    }
+
+    # Weather bucket IDs the taxonomy defines, in order
+    BUCKET_IDS = (
+        "weather_hot_dry",
+        "weather_hot_humid",
+        "weather_cool_dry",
+        "weather_cool_humid",
+        "weather_heavy_rain",
+        "weather_moderate",
+        "weather_arid",
+    )
+    _VALID_IDS = frozenset(BUCKET_IDS)
+
     def __init__(self, csv_path: str = "data/raw/weather.csv"):
         self.csv_path = Path(csv_path)
         self.df = None
+        self.bucket_groups = {}
 
     # LOAD DATASET
     def load(self):
         if not self.csv_path.exists():
             raise FileNotFoundError(f"Weather dataset not found at: {self.csv_path}")
 
-        self.df = pd.read_csv(self.csv_path)
-
-        required_cols = {
-            "temperature_celsius",
-            "humidity",
-            "precip_mm",
-            "wind_kph",
-            "location_name",
-            "region"
-        }
-
-        if not required_cols.issubset(self.df.columns):
-            raise ValueError(f"Weather dataset missing required columns: {required_cols}")
+        required_cols = set(self.COLUMN_DTYPES)
+        try:
+            self.df = pd.read_csv(
+                self.csv_path,
+                usecols=list(self.COLUMN_DTYPES),
+                dtype=self.COLUMN_DTYPES,
+            )
+        except ValueError as e:
+            # only a usecols miss means missing columns; bad dtypes etc. pass through
+            missing = required_cols - set(pd.read_csv(self.csv_path, nrows=0).columns)
+            if not missing:
+                raise
+            raise ValueError(f"Weather dataset missing required columns: {missing}") from e
 
         # Normalize location names (important for generating stable entry IDs)
         self.df["location_id"] = self.df["location_name"].str.lower().str.replace(" ", "_")
 
+        # Pre-filter rows per bucket once; buckets overlap, so each keeps its own frame
+        self.bucket_groups = {
+            bucket: self.df[mask].reset_index(drop=True)
+            for bucket, mask in self._bucket_masks(self.df).items()
+        }
+
     # TAXONOMY ENTRY IDS (weather buckets)
     def get_all_ids(self) -> List[str]:
         """
         Returns all weather bucket IDs the taxonomy defines.
         """
-        return [
-            "weather_hot_dry",
-            "weather_hot_humid",
-            "weather_cool_dry",
-            "weather_cool_humid",
-            "weather_heavy_rain",
-            "weather_moderate",
-            "weather_arid",
-        ]
+        return list(self.BUCKET_IDS)
 
     # RULES FOR EACH BUCKET  (Option A)
-    def _filter_bucket(self, bucket: str) -> pd.DataFrame:
-        df = self.df
-
+    def _bucket_masks(self, df: pd.DataFrame) -> Dict[str, pd.Series]:
         # convenience vars
         temp = df["temperature_celsius"]
         hum = df["humidity"]
@@ -73,35 +93,26 @@ class WeatherAdapter(BaseAdapter):
         HEAVY_RAIN = rain > 20
 
         # Bucket definitions 
-        if bucket == "weather_hot_dry":
-            return df[HOT & DRY_HUMIDITY & NO_RAIN]
-
-        if bucket == "weather_hot_humid":
-            return df[HOT & HUMID]
-
-        if bucket == "weather_cool_dry":
-            return df[COOL & NO_RAIN]
-
-        if bucket == "weather_cool_humid":
-            return df[COOL & HUMID]
-
-        if bucket == "weather_heavy_rain":
-            return df[HEAVY_RAIN]
-
-        if bucket == "weather_moderate":
-            return df[
+        return {
+            "weather_hot_dry": HOT & DRY_HUMIDITY & NO_RAIN,
+            "weather_hot_humid": HOT & HUMID,
+            "weather_cool_dry": COOL & NO_RAIN,
+            "weather_cool_humid": COOL & HUMID,
+            "weather_heavy_rain": HEAVY_RAIN,
+            "weather_moderate": (
                 (~HOT & ~COOL) &
                 (~HEAVY_RAIN) &
                 (hum >= 40) & (hum <= 70)
-            ]
-
-        if bucket == "weather_arid":
-            return df[HOT & DRY_HUMIDITY & NO_RAIN]
-
-        # Should never reach here
-        raise KeyError(f"Unknown weather bucket: {bucket}")
+            ),
+            "weather_arid": HOT & DRY_HUMIDITY & NO_RAIN,
+        }
 
     # SAMPLING LOGIC
+    @staticmethod
+    def _pick_row(df: pd.DataFrame) -> pd.Series:
+        """Random row by integer position; avoids building a 1-row DataFrame per call."""
+        return df.iloc[np.random.randint(len(df))]
+
     def sample(self, entry_id: str) -> Dict[str, Any]:
         """
         Returns structured weather JSON consistent with taxonomy attributes.
@@ -110,16 +121,16 @@ class WeatherAdapter(BaseAdapter):
         if self.df is None:
             raise RuntimeError("Call load() before sample()")
 
-        if entry_id not in self.get_all_ids():
+        if entry_id not in self._VALID_IDS:
             raise KeyError(f"Unknown weather entry ID: {entry_id}")
 
-        bucket_df = self._filter_bucket(entry_id)
+        bucket_df = self.bucket_groups[entry_id]
 
         if bucket_df.empty:
             # If no rows match, fallback to random row (but mark as 'approx')
-            row = self.df.sample(1).iloc[0]
+            row = self._pick_row(self.df)
         else:
-            row = bucket_df.sample(1).iloc[0]
+            row = self._pick_row(bucket_df)
 
         # return {
         #     "avg_temperature_c": float(row["temperature_celsius"]),
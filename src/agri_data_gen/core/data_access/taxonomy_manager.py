@@ -1,12 +1,46 @@
 import os
+import copy
+import time
+import uuid
 import yaml
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Any
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# libyaml-backed loader when available; same output as the pure-Python one
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# One client (connection pool + monitor threads) per URI for the whole process,
+# and the group index is ensured once per collection rather than per instance.
+_CLIENTS: Dict[str, MongoClient] = {}
+_INDEXED = set()
+
+
+def _get_client(uri: str) -> MongoClient:
+    client = _CLIENTS.get(uri)
+    if client is None:
+        client = _CLIENTS[uri] = MongoClient(uri)
+    return client
+
+
+def _load_taxonomy_file(path: Path) -> Dict[str, Any]:
+    # module level so it can be shipped to worker processes
+    if path.suffix in {".yaml", ".yml"}:
+        return yaml.load(path.read_bytes(), Loader=SafeLoader)
+    elif path.suffix == ".json":
+        import orjson
+        return orjson.loads(path.read_bytes())
+    else:
+        raise ValueError(f"Unsupported taxonomy file type: {path}")
+
 
 class TaxonomyManager:
     """
@@ -15,18 +49,33 @@ class TaxonomyManager:
     """
 
     REQUIRED_KEYS = {"group", "entries"}
+    TAXONOMY_EXTS = (".yaml", ".yml", ".json")
+    BULK_BATCH_SIZE = 500
+    PARALLEL_PARSE_MIN_FILES = 16  # below this, process start-up costs more than parsing
+    ACTIVE_CACHE_TTL = 30.0  # seconds
 
     def __init__(self, db_name: str = "taxonomy_db", collection_name: str = "taxonomies"):
         mongo_uri = os.getenv("MONGO_URI")
         if not mongo_uri:
             raise ValueError("MONGO_URI environment variable not set.")
 
-        self.client = MongoClient(mongo_uri)
+        self.client = _get_client(mongo_uri)
         self.db = self.client[db_name]
         self.collection = self.db[collection_name]
+        # one small doc per collection whose revision changes on every write
+        self.meta = self.db["taxonomy_meta"]
+        self.collection_name = collection_name
 
         # index for fast lookup by group
-        self.collection.create_index("group", unique=True)
+        index_key = (mongo_uri, db_name, collection_name)
+        if index_key not in _INDEXED:
+            self.collection.create_index("group", unique=True)
+            _INDEXED.add(index_key)
+
+        # read caches, cleared whenever this manager writes to the collection
+        self._tax_cache: Dict[str, Dict[str, Any]] = {}
+        self._active_cache: List[Dict[str, Any]] = None
+        self._active_cached_at = 0.0
 
     def load_from_files_and_store(self, taxonomy_dir: str) -> None:
         """
@@ -34,25 +83,25 @@ class TaxonomyManager:
         One document per taxonomy (group).
         """
 
-        taxonomy_paths = (
-            list(Path(taxonomy_dir).glob("*.yaml")) +
-            list(Path(taxonomy_dir).glob("*.yml")) +
-            list(Path(taxonomy_dir).glob("*.json"))
-        )
+        taxonomy_paths = self._list_files(taxonomy_dir, self.TAXONOMY_EXTS)
 
         if not taxonomy_paths:
             raise FileNotFoundError(f"No taxonomy files found in {taxonomy_dir}")
         
-       
-        for path in taxonomy_paths:
-            taxonomy = self._load_taxonomy_file(path)
+
+        self._clear_cache()
+
+        # validate per file, but defer the network I/O to batched bulk writes;
+        # keyed by group so a later file wins, as with sequential upserts
+        docs: Dict[str, Dict[str, Any]] = {}
+        for path, taxonomy in zip(taxonomy_paths, self._parse_files(taxonomy_paths)):
             self._validate_taxonomy_schema(taxonomy)
 
             attributes = taxonomy.get("attributes")
             if attributes is None:
                 attributes = []
 
-            taxonomy_doc = {
+            docs[taxonomy["group"]] = {
                 "group": taxonomy["group"],
                 "description": taxonomy.get("description", ""),
                 "attributes": attributes,
@@ -61,30 +110,82 @@ class TaxonomyManager:
                 "active": True
             }
 
-            # upsert by group (dimension name)
-            self.collection.update_one(
+        # fast path for first-time bootstrap: plain inserts into an empty collection
+        if self.collection.estimated_document_count() == 0:
+            try:
+                self._insert_batched(list(docs.values()))
+                self._bump_revision()
+                return
+            except BulkWriteError:
+                pass  # someone else populated it meanwhile; upsert below
+
+        # upsert by group (dimension name)
+        ops = []
+        for taxonomy_doc in docs.values():
+            ops.append(UpdateOne(
                 {"group": taxonomy_doc["group"]},
                 {"$set": taxonomy_doc},
                 upsert=True
-            )
+            ))
+
+            if len(ops) >= self.BULK_BATCH_SIZE:
+                self.collection.bulk_write(ops, ordered=False)
+                ops = []
+
+        if ops:
+            self.collection.bulk_write(ops, ordered=False)
+        self._bump_revision()
+
+    def get_revision(self) -> str:
+        """
+        Returns the revision stamp of the taxonomy collection, or None if it
+        has never been written by a manager that records revisions.
+        Lets callers validate an on-disk copy with one tiny lookup.
+        """
+        doc = self.meta.find_one({"_id": self.collection_name}, {"revision": 1})
+        return doc["revision"] if doc else None
+
+    def _bump_revision(self) -> None:
+        self.meta.update_one(
+            {"_id": self.collection_name},
+            {"$set": {"revision": uuid.uuid4().hex}},
+            upsert=True
+        )
+
+    def _insert_batched(self, docs: List[Dict[str, Any]]) -> None:
+        for i in range(0, len(docs), self.BULK_BATCH_SIZE):
+            # insert_many adds _id to the dicts; copy so the upsert fallback stays clean
+            batch = [dict(d) for d in docs[i:i + self.BULK_BATCH_SIZE]]
+            self.collection.insert_many(batch, ordered=False)
 
     def get_active_taxonomies(self) -> List[Dict[str, Any]]:
         """
         Returns all active taxonomy definitions.
+        Served from a short-lived cache to avoid re-querying right after a load;
+        callers get their own copy, as with get_taxonomy().
         """
-        return list(self.collection.find({"active": True}, {"_id": 0}))
+        now = time.monotonic()
+        if self._active_cache is None or now - self._active_cached_at > self.ACTIVE_CACHE_TTL:
+            self._active_cache = list(self.collection.find({"active": True}, {"_id": 0}))
+            self._active_cached_at = now
+        return copy.deepcopy(self._active_cache)
 
     def get_taxonomy(self, group: str) -> Dict[str, Any]:
         """
-        Fetch a taxonomy by group name.
+        Fetch a taxonomy by group name (cached per group). Callers get their
+        own copy, so mutating it cannot corrupt the cache.
         """
+        if group in self._tax_cache:
+            return copy.deepcopy(self._tax_cache[group])
+
         taxonomy = self.collection.find_one(
             {"group": group, "active": True},
             {"_id": 0}
         )
         if not taxonomy:
             raise KeyError(f"Active taxonomy not found for group '{group}'")
-        return taxonomy
+        self._tax_cache[group] = taxonomy
+        return copy.deepcopy(taxonomy)
 
     def get_entries(self, group: str) -> List[Dict[str, str]]:
         """
@@ -100,14 +201,32 @@ class TaxonomyManager:
         taxonomy = self.get_taxonomy(group)
         return taxonomy["attributes"]
 
+    def _clear_cache(self) -> None:
+        self._tax_cache.clear()
+        self._active_cache = None
+
+    @staticmethod
+    def _list_files(directory: str, exts: tuple) -> List[Path]:
+        """
+        Single os.scandir pass over `directory`, filtering by suffix.
+        """
+        with os.scandir(directory) as it:
+            return sorted(
+                Path(e.path) for e in it
+                if e.name.endswith(exts) and e.is_file()
+            )
+
     def _load_taxonomy_file(self, path: Path) -> Dict[str, Any]:
-        if path.suffix in {".yaml", ".yml"}:
-            return yaml.safe_load(path.read_text(encoding="utf-8"))
-        elif path.suffix == ".json":
-            import json
-            return json.loads(path.read_text(encoding="utf-8"))
-        else:
-            raise ValueError(f"Unsupported taxonomy file type: {path}")
+        return _load_taxonomy_file(path)
+
+    def _parse_files(self, paths: List[Path]) -> List[Dict[str, Any]]:
+        """
+        Parses taxonomy files, in a process pool when there are many of them.
+        """
+        if len(paths) < self.PARALLEL_PARSE_MIN_FILES:
+            return [self._load_taxonomy_file(p) for p in paths]
+        with ProcessPoolExecutor() as ex:
+            return list(ex.map(_load_taxonomy_file, paths))
 
     def _validate_taxonomy_schema(self, taxonomy: Dict[str, Any]) -> None:
         missing = self.REQUIRED_KEYS - taxonomy.keys()
@@ -136,5 +255,7 @@ class TaxonomyManager:
                 
     def reset_taxonomy_collection(self):
         """Deletes all taxonomy documents from MongoDB."""
+        self._clear_cache()
         result = self.collection.delete_many({})
+        self._bump_revision()
         return result.deleted_count
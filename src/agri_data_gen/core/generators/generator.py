@@ -1,86 +1,121 @@
 import os
 import time
-import json
+import atexit
+import orjson
+import asyncio
 import threading
-import concurrent.futures
+import weakref
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Tuple
 from tqdm import tqdm 
 
 from agri_data_gen.core.prompt.prompt_builder import PromptBuilder
 from agri_data_gen.core.providers.gemini_provider import GeminiProvider
+from agri_data_gen.core.jsonl_io import trim_partial_line
 
 
-class RateLimiter:
+# Engines with open output handles; one atexit hook closes whichever are
+# still alive without the registry keeping them alive.
+_OPEN_ENGINES = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_engines():
+    for engine in list(_OPEN_ENGINES):
+        engine.close()
+
+
+class AsyncRateLimiter:
     """
     Manages API rate limits (RPM) locally to prevent 429 errors.
+    Token bucket with a single token: callers are spaced 60/RPM seconds apart.
     """
     def __init__(self, max_calls_per_minute: int = 10):
         self.delay = 60.0 / max_calls_per_minute
-        self.last_call = 0.0
-        self.lock = threading.Lock()
+        self.next_slot = 0.0
+        self.lock = asyncio.Lock()
 
-    def wait(self):
-        with self.lock:
-            now = time.time()
-            elapsed = now - self.last_call
-            if elapsed < self.delay:
-                time.sleep(self.delay - elapsed)
-            self.last_call = time.time()
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            if now < self.next_slot:
+                await asyncio.sleep(self.next_slot - now)
+                now = self.next_slot
+            self.next_slot = now + self.delay
 
 class GenerationEngine:
     """
     Optimized Engine for JSONL Bundles.
-    Features: Parallel Processing, Rate Limiting, Crash Recovery.
+    Features: Concurrent (asyncio) Processing, Rate Limiting, Crash Recovery.
     """
 
     def __init__(self, 
                  bundle_file: str = "data/bundles/bundles.jsonl",
                  out_file: str = "data/generated/data.jsonl",
-                 max_workers: int = 1,  # Adjust based on API tier
-                 rpm_limit: int = 10):  
+                 max_workers: int = 1,  # Concurrent requests, adjust based on API tier
+                 rpm_limit: int = 10,
+                 fsync_every: int = 50,
+                 write_batch: int = 16):  
         
         self.bundle_file = Path(bundle_file)
         self.out_file = Path(out_file)
+        self.done_file = self.out_file.with_suffix(".done")
         self.provider = GeminiProvider()
         self.max_workers = max_workers
         
         # Ensure output directory exists
         self.out_file.parent.mkdir(parents=True, exist_ok=True)
         
-        # Thread-safe writing
+        # Thread-safe writing through one long-lived binary append handle;
+        # records are handed over via writelines() every `write_batch` records
+        # and fsynced every `fsync_every` writes instead of per record.
         self.file_lock = threading.Lock()
+        self.fsync_every = max(1, fsync_every)
+        self.write_batch = max(1, write_batch)
+        self._unsynced = 0
+        self._pending: List[bytes] = []
+        self._pending_done: List[str] = []
+        # a killed run can leave a torn last line; appending after it would
+        # glue the next record (or id) onto it
+        trim_partial_line(self.out_file)
+        trim_partial_line(self.done_file)
+        self._out_fh = self.out_file.open("ab", buffering=1 << 20)
+        self._done_fh = self.done_file.open("a", encoding="utf-8")
+        _OPEN_ENGINES.add(self)
         
         # Rate Limiter
-        self.limiter = RateLimiter(max_calls_per_minute=rpm_limit)
+        self.limiter = AsyncRateLimiter(max_calls_per_minute=rpm_limit)
         print(f"Output will be saved to: {self.out_file.absolute()}")
 
     def _load_processed_ids(self) -> set:
         """
-        Reads the output file to check which IDs are already done.
-        Allows resuming if the script stops.
+        Reads the `.done` sidecar to check which IDs are already done.
+        Allows resuming if the script stops; one bundle_id per line, no JSON parsing.
         """
-        processed_ids = set()
-        if self.out_file.exists():
-            with open(self.out_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    try:
-                        record = json.loads(line)
-                        # Assuming the input bundle has a 'bundle_id' or we use index
-                        if "bundle_id" in record:
-                            processed_ids.add(record["bundle_id"])
-                        # elif "id" in record:
-                        #     processed_ids.add(record["id"])
-                    except json.JSONDecodeError:
-                        continue
-        return processed_ids
-
-    def _process_single_bundle(self, line: str, line_idx: int):
+        if self.done_file.exists():
+            return set(self.done_file.read_text(encoding="utf-8").splitlines())
+        return set()
+
+    def _iter_bundles(self, limit: int = None):
+        """
+        Streams (line_idx, bundle) pairs from the bundle JSONL.
+        Lines are read as bytes and parsed once by orjson (no str decode);
+        malformed lines are skipped.
         """
-        Worker function to process one line of JSONL.
+        with open(self.bundle_file, 'rb') as f:
+            for idx, line in enumerate(f, start=1):
+                if limit and idx > limit:
+                    break
+                try:
+                    yield idx, orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+
+    async def _process_single_bundle_async(self, bundle: Dict[str, Any], line_idx: int):
+        """
+        Coroutine processing one parsed bundle.
         """
         try:
-            bundle = json.loads(line)
             #  This ID determines resume capability. 
             bundle_id = bundle.get("bundle_id", f"row_{line_idx}")
 
@@ -88,16 +123,14 @@ class GenerationEngine:
             input_context = bundle # Pass everything (Crop, Weather, etc.)
             
             # Prompt Building
-            prompt = PromptBuilder.build(
-                json.dumps(input_context, ensure_ascii=False, indent=2), 
-                bundle_id
-            )
+            prompt = PromptBuilder.build(input_context, bundle_id)
 
-            # Rate Limiting 
-            self.limiter.wait()
+            async with self._sem:
+                # Rate Limiting 
+                await self.limiter.acquire()
 
-            # API Call with Retry Logic
-            response = self._call_provider_with_retry(prompt)
+                # API Call with Retry Logic
+                response = await self._call_provider_with_retry_async(prompt)
 
             # Result Construction
             combined_record = {
@@ -107,12 +140,17 @@ class GenerationEngine:
                 "output": response 
             }
 
-            # Thread-Safe Write with FLUSH
+            # Thread-Safe Write, periodic FLUSH + fsync
             with self.file_lock:
-                with open(self.out_file, "a", encoding="utf-8") as f_out:
-                    f_out.write(json.dumps(combined_record, ensure_ascii=False) + "\n")
-                    f_out.flush() 
-                    os.fsync(f_out.fileno())
+                self._pending.append(orjson.dumps(
+                    combined_record, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+                ))
+                self._pending_done.append(f"{bundle_id}\n")
+                if len(self._pending) >= self.write_batch:
+                    self._flush_pending_locked()
+                self._unsynced += 1
+                if self._unsynced >= self.fsync_every:
+                    self._sync_locked()
 
             return True
 
@@ -121,25 +159,48 @@ class GenerationEngine:
             return False
 
 
-    def _call_provider_with_retry(self, prompt, retries=3):
+    def _flush_pending_locked(self):
+        """Hands buffered records to the output handles. Caller must hold file_lock."""
+        self._out_fh.writelines(self._pending)
+        self._done_fh.writelines(self._pending_done)
+        self._pending.clear()
+        self._pending_done.clear()
+
+    def _sync_locked(self):
+        """Flushes and fsyncs the output handles. Caller must hold file_lock."""
+        self._flush_pending_locked()
+        # Records first, so the sidecar never lists an id whose record was lost
+        for fh in (self._out_fh, self._done_fh):
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        """Syncs any pending records and closes the output handle."""
+        with self.file_lock:
+            if not self._out_fh.closed:
+                self._sync_locked()
+                self._out_fh.close()
+                self._done_fh.close()
+
+    async def _call_provider_with_retry_async(self, prompt, retries=3):
         """
         Handles 429 (Rate Limit) and 500 errors with exponential backoff.
         """
         base_delay = 10
         for attempt in range(retries):
             try:
-                # Assuming provider.generate returns the string text
-                return self.provider.generate(prompt)
+                return await self.provider.agenerate(prompt)
             except Exception as e:
                 error_msg = str(e).lower()
                 # Check for rate limit or server errors
                 if "429" in error_msg or "quota" in error_msg or "500" in error_msg:
                     wait_time = base_delay * (2 ** attempt)
                     print(f"API Limit hit. Retrying in {wait_time}s...")
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                 elif "500" in error_msg or "internal" in error_msg:
                     print(f"⚠️ Server Error (500). Retrying...")
-                    time.sleep(2)
+                    await asyncio.sleep(2)
                 else:
                     raise e # Raise other errors immediately
         raise Exception("Max retries exceeded")
@@ -147,7 +208,13 @@ class GenerationEngine:
 
     def generate_all(self, limit: int = None):
         """
-        Main execution loop using ThreadPool.
+        Main entry point; runs the asyncio generation loop to completion.
+        """
+        asyncio.run(self._generate_async(limit))
+
+    async def _generate_async(self, limit: int = None):
+        """
+        Main execution loop: max_workers concurrent requests on one event loop.
         """
         print(f"Starting Generation Engine")
 
@@ -155,39 +222,86 @@ class GenerationEngine:
         processed_ids = self._load_processed_ids()
         print(f"Found {len(processed_ids)} already processed records. Skipping them.")
 
-        # Read all lines 
-        with open(self.bundle_file, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
+        self._sem = asyncio.Semaphore(self.max_workers)
 
-        if limit:
-            lines = lines[:limit]
+        # Stream bundles and keep at most a few tasks per worker in flight
+        max_in_flight = self.max_workers * 4
+        submitted = 0
 
-        # Filter out already done
-        work_items = []
-        for idx, line in enumerate(lines, start=1):
-            # Quick check if we can parse ID to skip
-            try:
-                b_id = json.loads(line).get("bundle_id", f"row_{idx}")
-                if b_id not in processed_ids:
-                    work_items.append((line, idx))
-            except:
-                continue
-        
-        if not work_items:
+        with tqdm(unit="req") as progress:
+            in_flight = set()
+            for idx, bundle in self._iter_bundles(limit):
+                if bundle.get("bundle_id", f"row_{idx}") in processed_ids:
+                    continue
+
+                in_flight.add(asyncio.create_task(self._process_single_bundle_async(bundle, idx)))
+                submitted += 1
+
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    progress.update(len(done))
+
+            for task in asyncio.as_completed(in_flight):
+                await task
+                progress.update(1)
+
+        with self.file_lock:
+            self._sync_locked()
+
+        if not submitted:
+            print("All items already processed!")
+            return
+
+        print(f"\nGeneration complete. Data saved to {self.out_file}")
+
+    async def generate_stream(self, bundles: AsyncIterator[Tuple[int, Dict[str, Any]]],
+                              limit: int = None):
+        """
+        Consumes (line_idx, bundle) pairs from an async producer (e.g.
+        BundleBuilder.build_stream) through a bounded queue, so generation
+        overlaps with the build. Bundles past `limit` are drained, not generated.
+        """
+        print(f"Starting Generation Engine (streaming)")
+
+        processed_ids = self._load_processed_ids()
+        print(f"Found {len(processed_ids)} already processed records. Skipping them.")
+
+        self._sem = asyncio.Semaphore(self.max_workers)
+        queue = asyncio.Queue(maxsize=self.max_workers * 2)
+        submitted = 0
+
+        with tqdm(unit="req") as progress:
+            async def worker():
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        return
+                    idx, bundle = item
+                    await self._process_single_bundle_async(bundle, idx)
+                    progress.update(1)
+
+            workers = [asyncio.create_task(worker()) for _ in range(self.max_workers)]
+
+            async for idx, bundle in bundles:
+                if limit and idx > limit:
+                    continue
+                if bundle.get("bundle_id", f"row_{idx}") in processed_ids:
+                    continue
+                await queue.put((idx, bundle))
+                submitted += 1
+
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        with self.file_lock:
+            self._sync_locked()
+
+        if not submitted:
             print("All items already processed!")
             return
-        
-        #  Execution - for parallel increase executors.
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # Submit all tasks
-            futures = [
-                executor.submit(self._process_single_bundle, item[0], item[1]) 
-                for item in work_items
-            ]
-            
-            # Progress Bar
-            for _ in tqdm(concurrent.futures.as_completed(futures), total=len(futures), unit="req"):
-                pass
 
         print(f"\nGeneration complete. Data saved to {self.out_file}")
 
@@ -0,0 +1,24 @@
+import os
+
+
+def trim_partial_line(path):
+    """
+    Drops a trailing line left unterminated by an interrupted run, so the
+    next append starts on a fresh line. Creates the file if it is missing.
+    """
+    with open(path, "ab+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if not size:
+            return
+        pos = size
+        while pos > 0:
+            step = min(pos, 1 << 16)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            nl = chunk.rfind(b"\n")
+            if nl != -1:
+                pos += nl + 1
+                break
+        if pos != size:
+            f.truncate(pos)
@@ -1,6 +1,10 @@
-import json
+import os
+import asyncio
+import orjson
 import itertools
-from typing import List, Dict, Any
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Iterator, AsyncIterator, Tuple
 from pathlib import Path
 
 from agri_data_gen.core.data_access.taxonomy_manager import TaxonomyManager
@@ -12,8 +16,20 @@ class BundleBuilder:
     Region -> Crop -> Classification -> Variety -> Stress -> Yield -> Stage
     """
 
-    def __init__(self, out_dir: str = "data/bundles"):
+    WRITE_BATCH = 4096        # lines handed to writelines() at once
+    WRITE_BUFFER = 1 << 20    # output file buffer size in bytes
+    PARALLEL_CHUNK_LINES = 50_000  # approx. lines serialized per worker task
+    TAXONOMY_CACHE = ".taxonomy_cache.json"  # in out_dir, keyed by taxonomy revision
+    # Bump whenever the loop nesting changes: line numbers and ids shift, so
+    # resume state written against an older file no longer lines up.
+    BUNDLE_ORDER = "2"  # region -> language -> independent combo -> crop -> problem
+
+    def __init__(self, out_dir: str = "data/bundles", workers: int = 1):
+        """
+        workers > 1 serializes bundles in that many processes (build_all only).
+        """
         self.out_dir = Path(out_dir)
+        self.workers = workers
         self.out_dir.mkdir(parents=True, exist_ok=True)
         self.taxonomy_manager = TaxonomyManager()
         
@@ -31,21 +47,28 @@ class BundleBuilder:
         
         # We will initialize adapters in load_all() once we have the schema
         self.adapters = {}
+        # (group, entry_id) -> sampled data; reset whenever adapters are rebuilt
+        self._sample_cache: Dict[Tuple[str, Any], Dict[str, Any]] = {}
 
-    def load_all(self):
+    def load_all(self, refresh_taxonomy: bool = False):
         """
         Load datasets and taxonomy definitions.
         Then, initialize adapters with the correct schema attributes.
+        refresh_taxonomy=True ignores the on-disk taxonomy cache.
         """
         # Load Taxonomies 
-        self.taxonomies = self.taxonomy_manager.get_active_taxonomies()
+        self.taxonomies = self._load_taxonomies(refresh_taxonomy)
+        self._tax_by_group = {t["group"]: t for t in self.taxonomies}
         all_groups = self.INDEPENDENT_AXES + self.DEPENDENT_GROUPS
         
-        # Initialize Adapters dynamically based on loaded schemas
+        # Initialize Adapters dynamically based on loaded schemas, and record
+        # the independent-axis plan (group, tax_def, adapter) in the same pass
         print("Initializing adapters with schemas...")
+        self._axes = []
+        self._sample_cache.clear()
         for group in all_groups:
             # Find the taxonomy definition to get its attributes
-            tax_def = next((t for t in self.taxonomies if t["group"] == group), None)
+            tax_def = self._tax_by_group.get(group)
             
             # If found, extract attributes (e.g. ['soil_type', 'rainfall'])
             attrs = tax_def["attributes"] if tax_def else []
@@ -54,104 +77,337 @@ class BundleBuilder:
             self.adapters[group] = GenericAdapter(group, attributes=attrs)
             self.adapters[group].load() # Validates readiness
 
+            if group in self.INDEPENDENT_AXES:
+                if tax_def:
+                    self._axes.append((group, tax_def, self.adapters[group]))
+                else:
+                    print(f"Warning: Taxonomy group '{group}' not found in DB. Skipping axis.")
+
+    def _load_taxonomies(self, refresh: bool = False) -> List[Dict[str, Any]]:
+        """
+        Active taxonomies, served from the out_dir cache file while the
+        collection's revision stamp matches; otherwise fetched and re-cached.
+        The stamp is only bumped by TaxonomyManager writes: after editing the
+        collection outside it (mongo shell, Compass), pass refresh=True
+        (--refresh-taxonomy on the CLI).
+        """
+        cache_path = self.out_dir / self.TAXONOMY_CACHE
+        revision = self.taxonomy_manager.get_revision()
+
+        if not refresh and revision is not None and cache_path.exists():
+            try:
+                cached = orjson.loads(cache_path.read_bytes())
+                if cached.get("revision") == revision:
+                    return cached["taxonomies"]
+            except (orjson.JSONDecodeError, KeyError, AttributeError):
+                pass  # unreadable cache; fall through and rebuild it
+
+        taxonomies = self.taxonomy_manager.get_active_taxonomies()
+        if revision is not None:
+            # write then rename, so an interrupted run never leaves a torn cache
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            try:
+                tmp_path.write_bytes(orjson.dumps({"revision": revision, "taxonomies": taxonomies}))
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                print(f"Warning: could not write taxonomy cache {cache_path}: {e}")
+        return taxonomies
+
     def build_all(self, filename: str = "bundles.jsonl") -> str:
         output_path = self.out_dir / filename
         print(f"Building ordered bundles into: {output_path} ...")
+        self._check_bundle_order(output_path)
 
+        count = 0
+        batch = []
+        with open(output_path, 'wb', buffering=self.WRITE_BUFFER) as f:
+            if self.workers > 1:
+                count = self._write_parallel(f)
+            else:
+                for line in self._iter_lines():
+                    batch.append(line)
+                    if len(batch) >= self.WRITE_BATCH:
+                        f.writelines(batch)
+                        count += len(batch)
+                        batch.clear()
+                f.writelines(batch)
+                count += len(batch)
+        self._order_path(output_path).write_text(self.BUNDLE_ORDER)
+
+        print(f"Successfully generated {count} valid scenarios.")
+        return str(output_path)
+
+    async def build_stream(self, filename: str = "bundles.jsonl",
+                           yield_every: int = 64) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Async variant of build_all(): still writes the JSONL file, but also
+        yields (id, bundle) as each one is built so a consumer can start
+        working before the build finishes. Control returns to the event loop
+        every `yield_every` bundles.
+        """
+        output_path = self.out_dir / filename
+        print(f"Streaming ordered bundles into: {output_path} ...")
+        self._check_bundle_order(output_path)
+        self._order_path(output_path).write_text(self.BUNDLE_ORDER)
+
+        count = 0
+        with open(output_path, 'wb', buffering=self.WRITE_BUFFER) as f:
+            for final_bundle in self.iter_bundles():
+                f.write(orjson.dumps(final_bundle, option=orjson.OPT_APPEND_NEWLINE))
+                count += 1
+                # iter_bundles reuses one dict; hand the consumer its own copy
+                yield final_bundle["id"], dict(final_bundle)
+                if count % yield_every == 0:
+                    await asyncio.sleep(0)
+
+        print(f"Successfully generated {count} valid scenarios.")
+
+    @staticmethod
+    def _order_path(output_path: Path) -> Path:
+        return output_path.with_name(output_path.name + ".order")
+
+    def _check_bundle_order(self, output_path: Path):
+        """
+        Warns when an existing bundle file was written in a different line
+        order: ids and line numbers change, so generator `.done` files,
+        validator batch ids and data/cursor.txt from earlier runs must be
+        cleared before resuming.
+        """
+        if not output_path.exists():
+            return
+        order_path = self._order_path(output_path)
+        previous = order_path.read_text().strip() if order_path.exists() else None
+        if previous != self.BUNDLE_ORDER:
+            print(f"WARNING: {output_path} was built with bundle order "
+                  f"{previous or 'unversioned'}, rebuilding with order {self.BUNDLE_ORDER}. "
+                  "Bundle ids and line numbers change: clear generator .done files, "
+                  "classification batches and data/cursor.txt before resuming.")
+
+    def _sample(self, group: str, adapter, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        adapter.sample(entry)["data"], memoized per (group, entry id) so
+        repeated builds on this instance don't re-sample. GenericAdapter
+        sampling is deterministic, so cached results stay valid.
+        """
+        entry_id = entry.get("id")
+        if entry_id is None:
+            return adapter.sample(entry).get("data", entry)
+        key = (group, entry_id)
+        data = self._sample_cache.get(key)
+        if data is None:
+            data = self._sample_cache[key] = adapter.sample(entry).get("data", entry)
+        return data
+
+    def _prepare(self):
+        """
+        Samples every axis once and returns the combination inputs:
+        (axis_names, independent_axes_data, valid_regions, valid_crops).
+        independent_axes_data[i] holds the values of axis axis_names[i].
+        """
         # 1. Collect Data for each Axis in strict order
         independent_axes_data = []
+        axis_names = []
 
-        for group_name in self.INDEPENDENT_AXES:
-            tax_def = next((t for t in self.taxonomies if t["group"] == group_name), None)
-            
-            if not tax_def:
-                print(f"Warning: Taxonomy group '{group_name}' not found in DB. Skipping axis.")
-                continue
-
-            adapter = self.adapters.get(group_name)
+        for group_name, tax_def, adapter in self._axes:
             entries = tax_def["entries"]
             
             current_axis_values = []
             for entry in entries:
                 if adapter:
-                    real_data = adapter.sample(entry).get("data", entry)
+                    real_data = self._sample(group_name, adapter, entry)
                 else:
                     real_data = entry
-                current_axis_values.append((group_name, real_data))
+                current_axis_values.append(real_data)
             
             independent_axes_data.append(current_axis_values)
+            axis_names.append(group_name)
 
 
         # Generate Combinations
         #crop
-        crop_def = next((t for t in self.taxonomies if t["group"] == "crop"), None)
+        crop_def = self._tax_by_group.get("crop")
         if not crop_def:
             raise ValueError("Crop taxonomy missing!")
         crop_adapter = self.adapters.get("crop")
         crop_entries = crop_def["entries"]
 
         #region
-        region_def = next((t for t in self.taxonomies if t["group"] == "region_lang"), None)
+        region_def = self._tax_by_group.get("region_lang")
         if not region_def:
             raise ValueError("Region_lang taxonomy missing!")
         region_adapter = self.adapters.get("region_lang")
         region_entries = region_def["entries"]
 
+        # Sample each dependent entry once, up front; the payloads are
+        # identical for every combination they appear in.
+        valid_regions = []
+        for region_entry in region_entries:
+            processed_region = self._sample("region_lang", region_adapter, region_entry)
+            allowed_languages = processed_region.get("languages", [])
+
+            if not allowed_languages: 
+                continue
+
+            region_payload = {k: v for k, v in processed_region.items() if k != "languages"}
+            valid_regions.append((region_payload, allowed_languages))
+
+        valid_crops = []
+        for crop_entry in crop_entries:
+            processed_crop = self._sample("crop", crop_adapter, crop_entry)
+            problems_list = processed_crop.get("problems", [])
+
+            if not problems_list:
+                continue
+
+            crop_payload = {k: v for k, v in processed_crop.items() if k != "problems"}
+            valid_crops.append((crop_payload, problems_list))
+
+        return axis_names, independent_axes_data, valid_regions, valid_crops
+
+    def iter_bundles(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields every valid bundle in output order, ids starting at 1.
+        The same dict is updated in place and yielded each time, so consumers
+        must serialize or copy it before advancing the iterator.
+        """
+        axis_names, independent_axes_data, valid_regions, valid_crops = self._prepare()
+
         #HYBRID GENERATION LOOP
+        # One bundle dict, keys pre-inserted in output order; each loop level
+        # only overwrites its own key instead of copying the whole bundle.
+        bundle = dict.fromkeys(axis_names + ["region", "language", "id", "crop", "stress"])
+        ids = itertools.count(1)
+
+        # Region / language outermost so their payloads are set once and
+        # reused across every independent combination.
+        for region_payload, allowed_languages in valid_regions:
+            bundle["region"] = region_payload
+
+            #Languages (Nested inside Region)
+            for lang_entry in allowed_languages:
+                bundle["language"] = lang_entry
+
+                #cartesian product (independent entries)
+                for indep_combo in itertools.product(*independent_axes_data):
+                    bundle.update(zip(axis_names, indep_combo))
+
+                    #crops
+                    for crop_payload, problems_list in valid_crops:
+                        bundle["crop"] = crop_payload
+
+                        for problem in problems_list:
+                            bundle["id"] = next(ids)
+                            bundle["stress"] = problem # This contains the specific ID and Label
+                            
+                            yield bundle
+
+    def _fragments(self):
+        """
+        Encodes every axis value once with orjson: returns (indep_heads,
+        region_lang_frags, tails) where a line is
+        indep_head + region_lang_frag + id + tail, in loop order
+        region -> language -> independent combo -> crop -> problem.
+        Output matches orjson.dumps(bundle) byte for byte.
+        """
+        axis_names, independent_axes_data, valid_regions, valid_crops = self._prepare()
+        dumps = orjson.dumps
+
+        def field(key, value):
+            return dumps(key) + b":" + dumps(value)
+
+        indep_frags = [
+            [field(group_name, data) for data in axis]
+            for group_name, axis in zip(axis_names, independent_axes_data)
+        ]
+        # b'{"growth_stage":...,"weather":...,' per independent combination
+        indep_heads = [
+            b"{" + b"".join(frag + b"," for frag in combo)
+            for combo in itertools.product(*indep_frags)
+        ]
+        # b'"region":...,"language":...,"id":' per (region, language)
+        region_lang_frags = [
+            field("region", region_payload) + b"," + field("language", lang) + b',"id":'
+            for region_payload, allowed_languages in valid_regions
+            for lang in allowed_languages
+        ]
+        # everything after the id, per (crop, problem)
+        tails = [
+            b"," + field("crop", crop_payload) + b"," + field("stress", problem) + b"}\n"
+            for crop_payload, problems_list in valid_crops
+            for problem in problems_list
+        ]
+        return indep_heads, region_lang_frags, tails
+
+    @staticmethod
+    def _heads(indep_heads, region_lang_frags) -> Iterator[bytes]:
+        for region_lang in region_lang_frags:
+            for indep_head in indep_heads:
+                yield indep_head + region_lang
+
+    def _iter_lines(self) -> Iterator[bytes]:
+        """
+        Same records as iter_bundles(), already serialized as JSONL lines.
+        """
+        indep_heads, region_lang_frags, tails = self._fragments()
+        return _lines_for_heads(self._heads(indep_heads, region_lang_frags), tails, 1)
+
+    def _write_parallel(self, f) -> int:
+        """
+        Serializes chunks of line heads in worker processes and writes the
+        returned blobs in submission order. Returns the count.
+        """
+        indep_heads, region_lang_frags, tails = self._fragments()
+        if not tails:
+            return 0
+        heads_per_chunk = max(1, self.PARALLEL_CHUNK_LINES // len(tails))
+
+        def chunks():
+            heads = self._heads(indep_heads, region_lang_frags)
+            start_id = 1
+            while True:
+                chunk = list(itertools.islice(heads, heads_per_chunk))
+                if not chunk:
+                    return
+                yield start_id, chunk
+                start_id += len(chunk) * len(tails)
+
         count = 0
-        with open(output_path, 'w', encoding='utf-8') as f:
-            
-            #cartesian product (independent entries)
-            for indep_combo in itertools.product(*independent_axes_data):
-                context_bundle = {}
-                for group_name, data in indep_combo:
-                    context_bundle[group_name] = data
-
-                # Region
-                for region_entry in region_entries:
-                    processed_region = region_adapter.sample(region_entry).get("data", region_entry)
-                    allowed_languages = processed_region.get("languages", [])
-
-                    if not allowed_languages: 
-                        continue
-
-                    region_payload = processed_region.copy()
-                    if "languages" in region_payload:
-                        del region_payload["languages"]
-
-                    #Languages (Nested inside Region)
-                    for lang_entry in allowed_languages:
-                        
-                        #region+Language
-                        base_bundle = context_bundle.copy()
-                        base_bundle["region"] = region_payload
-                        base_bundle["language"] = lang_entry
-
-                        #crops
-                        for crop_entry in crop_entries:
-                            processed_crop = crop_adapter.sample(crop_entry).get("data", crop_entry)
-                            problems_list = processed_crop.get("problems", [])
-
-                            if not problems_list:
-                                continue
-
-                            crop_payload = processed_crop.copy()
-                            if "problems" in crop_payload:
-                                del crop_payload["problems"]
-
-                            for problem in problems_list:
-                                # Clone the base bundle
-                                final_bundle = base_bundle.copy()
-                                final_bundle["id"] = count + 1
-                                # Add Crop and Specific Stress
-                                final_bundle["crop"] = crop_payload
-                                final_bundle["stress"] = problem # This contains the specific ID and Label
-                                
-                                f.write(json.dumps(final_bundle, ensure_ascii=False) + "\n")
-                                count += 1
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_serializer,
+                                 initargs=(tails,)) as ex:
+            # a bounded window of chunks in flight, so finished blobs can't pile
+            # up in memory faster than they are written (ex.map submits them all)
+            pending = collections.deque()
+            for args in chunks():
+                pending.append(ex.submit(_serialize_chunk, args))
+                if len(pending) >= 2 * self.workers:
+                    blob, n = pending.popleft().result()
+                    f.write(blob)
+                    count += n
+            while pending:
+                blob, n = pending.popleft().result()
+                f.write(blob)
+                count += n
+        return count
+
+
+# Process-pool helpers for BundleBuilder._write_parallel; the shared
+# tail fragments are sent once per worker instead of with every chunk.
+_SERIALIZER_TAILS = None
+
+
+def _lines_for_heads(heads, tails, start_id) -> Iterator[bytes]:
+    ids = itertools.count(start_id)
+    for head in heads:
+        for tail in tails:
+            yield head + b"%d" % next(ids) + tail
 
-        print(f"Successfully generated {count} valid scenarios.")
-        return str(output_path)
 
+def _init_serializer(tails):
+    global _SERIALIZER_TAILS
+    _SERIALIZER_TAILS = tails
 
 
+def _serialize_chunk(args):
+    start_id, heads = args
+    lines = list(_lines_for_heads(heads, _SERIALIZER_TAILS, start_id))
+    return b"".join(lines), len(lines)
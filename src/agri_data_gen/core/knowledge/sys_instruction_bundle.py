@@ -1,10 +1,17 @@
 import itertools
-import json
+import orjson
 import yaml
+import os
 import logging
 from pathlib import Path
 from typing import List, Dict
 
+# libyaml-backed loader when available
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -15,6 +22,9 @@ class SystemInstructionBuilder:
     a Cartesian Product of 4 modular prompt sections.
     """
 
+    WRITE_BATCH = 4096        # lines handed to writelines() at once
+    WRITE_BUFFER = 1 << 20    # output file buffer size in bytes
+
     def __init__(self, taxonomy_dir: str = "sample_data/sys_instructions_taxonomy", output_dir: str = "data/sys_instructions"):
         self.taxonomy_dir = Path(taxonomy_dir)
         self.output_dir = Path(output_dir)
@@ -29,16 +39,40 @@ class SystemInstructionBuilder:
         ]
 
     def load_yaml_entries(self, filename: str) -> List[Dict]:
-        """Helper to load 'entries' from a YAML file."""
+        """
+        Helper to load 'entries' from a YAML file.
+        Parsed entries are cached as JSON under taxonomy_dir/.cache/ and reused
+        until the YAML file is modified.
+        """
         path = self.taxonomy_dir / filename
         if not path.exists():
             logger.error(f"Critical: File not found {path}")
             raise FileNotFoundError(f"{path} missing.")
+
+        cache_path = self.taxonomy_dir / ".cache" / f"{path.stem}.json"
+        if cache_path.exists() and cache_path.stat().st_mtime >= path.stat().st_mtime:
+            try:
+                entries = orjson.loads(cache_path.read_bytes())["entries"]
+            except (OSError, orjson.JSONDecodeError, KeyError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable entry cache {cache_path}: {e}")
+            else:
+                logger.info(f"Loaded {len(entries)} entries from {filename} (cached)")
+                return entries
             
-        with open(path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
+        with open(path, "rb") as f:
+            data = yaml.load(f, Loader=SafeLoader)
         
         entries = data.get("entries", [])
+        try:
+            cache_path.parent.mkdir(exist_ok=True)
+            # write then rename, so an interrupted run never leaves a torn cache
+            tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_bytes(orjson.dumps({"entries": entries}))
+            os.replace(tmp_path, cache_path)
+        except (OSError, TypeError) as e:
+            # TypeError: orjson.JSONEncodeError for entries JSON can't hold
+            # (e.g. non-str mapping keys); the build goes on uncached
+            logger.warning(f"Could not write entry cache {cache_path}: {e}")
         logger.info(f"Loaded {len(entries)} entries from {filename}")
         return entries
 
@@ -54,39 +88,47 @@ class SystemInstructionBuilder:
         for yaml_file in self.SECTIONS:
             data_lists.append(self.load_yaml_entries(yaml_file))
 
-        # 2. Perform Cartesian Product
-        count = 0
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for combination in itertools.product(*data_lists):
-                # combination is a tuple: (role_entry, lang_entry, analysis_entry, output_entry)
-                
-                role, lang, analysis, output = combination
-
-                # 3. Construct the Full System Prompt
-                full_text = (
-                    f"{role['text'].strip()}\n\n"
-                    f"{lang['text'].strip()}\n\n"
-                    f"{analysis['text'].strip()}\n\n"
-                    f"{output['text'].strip()}"
-                )
-
-                # 4. Construct Metadata ID
-                combo_id = f"{role['id']}__{lang['id']}__{analysis['id']}__{output['id']}"
-
-                record = {
-                    "id": count+1, #combo_id,
-                    "components": {
-                        "role_id": role['id'],
-                        "lang_id": lang['id'],
-                        "analysis_id": analysis['id'],
-                        "output_id": output['id']
-                    },
-                    "system_instruction": full_text
-                }
-
-                f.write(json.dumps(record, ensure_ascii=False) + "\n")
-                count += 1
+        # 2. Encode each entry's pieces once with orjson; JSON string escaping
+        # is per character, so the escaped texts can be joined inside one literal.
+        dumps = orjson.dumps
+        encoded = [
+            [(dumps(e['id']), dumps(e['text'].strip())[1:-1]) for e in entries]
+            for entries in data_lists
+        ]
+        nl = dumps("\n\n")[1:-1]
+
+        roles, langs, analyses, outputs = encoded
+
+        # The inner (analysis, output) pairs are identical for every role/lang,
+        # so their pieces are assembled once
+        inner = [
+            (b'"analysis_id":%b,"output_id":%b},"system_instruction":"' % (analysis_id, output_id),
+             analysis_text + nl + output_text + b'"}\n')
+            for (analysis_id, analysis_text), (output_id, output_text)
+            in itertools.product(analyses, outputs)
+        ]
+
+        # 3. Perform Cartesian Product
+        # Same bytes as orjson.dumps of
+        # {"id", "components": {role_id, lang_id, analysis_id, output_id}, "system_instruction"}
+        ids = itertools.count(1)
+        batch = []
+        with open(output_path, 'wb', buffering=self.WRITE_BUFFER) as f:
+            for role_id, role_text in roles:
+                for lang_id, lang_text in langs:
+                    # role + lang prefixes, built once per outer pair
+                    components = b',"components":{"role_id":%b,"lang_id":%b,' % (role_id, lang_id)
+                    text = role_text + nl + lang_text + nl
+
+                    for inner_components, inner_text in inner:
+                        batch.append(b'{"id":%d' % next(ids) + components + inner_components
+                                     + text + inner_text)
+                    if len(batch) >= self.WRITE_BATCH:
+                        f.writelines(batch)
+                        batch.clear()
+            f.writelines(batch)
 
+        count = next(ids) - 1
         logger.info(f"Successfully generated {count} unique System Instructions at {output_path}")
         return str(output_path)
 
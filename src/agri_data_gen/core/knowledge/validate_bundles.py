@@ -1,12 +1,16 @@
-import json
 import os
-import math
+import orjson
+import argparse
 import time
+import asyncio
 import logging
+from itertools import islice
 from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 
+from agri_data_gen.core.providers.batch_runner import BatchRunner
+from agri_data_gen.core.jsonl_io import trim_partial_line
+
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
@@ -14,12 +18,33 @@ logger = logging.getLogger(__name__)
 
 
 class BatchValidator:
+    # (prompt label, bundle key) pairs, in the order they appear in the prompt
+    _FIELDS = (
+        ("Crop", "crop"),
+        ("Stage", "growth_stage"),
+        ("Weather", "weather"),
+        ("Stress", "stress"),
+        ("Soil Type", "soil_type"),
+        ("Region", "region"),
+        ("Farming Practice", "farming_practice"),
+    )
+    # Record tails per confidence bucket, indexed INVALID, WEAK_VALID, VALID
+    _LABEL_SUFFIXES = (
+        b',"validation_label":"INVALID","validation_status":"INVALID"}\n',
+        b',"validation_label":"WEAK_VALID"}\n',
+        b',"validation_label":"VALID"}\n',
+    )
+    _LABELS = ("INVALID", "WEAK_VALID", "VALID")
+
     def __init__(self):
         self.api_key = os.getenv("GOOGLE_API_KEY_SOKET")
         self.model_name = "gemini-2.5-flash"
         self.client = genai.Client(api_key=self.api_key)
 
         self.BATCH_SIZE = 7700  # As requested
+
+        # upload, polling and download are shared with GeminiProvider
+        self.runner = BatchRunner(self.client, self.model_name)
         self.job_id_base = f"val_job_{int(time.time())}"
         # self.job_id = f"validation_batch_{int(time.time())}"
 
@@ -52,155 +77,170 @@ class BatchValidator:
         } }
         """
 
-    def initialize_output_files(self):
-        """Clears/Creates output files at the start so we can append later."""
-        logger.info("Initializing output files (clearing previous run data)...")
-        open(self.valid_output, 'w').close()
-        open(self.weak_valid_output, 'w').close()
-        open(self.invalid_output, 'w').close()
+        # Identical for every request; built once and shared by reference
+        self.generation_config = {
+            "responseMimeType": "application/json",
+            "temperature": 0.0,
+            "thinkingConfig": {
+                "includeThoughts": False,
+                "thinkingBudget": 0
+            }
+        }
+        self.system_instruction_block = {
+            "parts": [{"text": self.system_instruction}]
+        }
+
+    def initialize_output_files(self, reset=False):
+        """
+        Creates the output files so we can append later. With reset=True any
+        previous run data is cleared; otherwise it is kept and resumed from.
+        """
+        if reset:
+            logger.info("Initializing output files (clearing previous run data)...")
+        for path in (self.valid_output, self.weak_valid_output, self.invalid_output):
+            if reset:
+                open(path, 'w').close()
+            else:
+                trim_partial_line(path)
+
+    def load_classified_ids(self):
+        """Returns the ids of every bundle already written to an output file."""
+        done = set()
+        for path in (self.valid_output, self.weak_valid_output, self.invalid_output):
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    try:
+                        done.add(str(orjson.loads(line)["id"]))
+                    except (orjson.JSONDecodeError, KeyError, TypeError):
+                        continue # e.g. a line cut short by an interrupted run
+        return done
 
 
     # CREATE BATCH FILE
-    def create_batch_files(self):
-        """Reads big input file and splits it into multiple small request files."""
+    def create_batch_files(self, skip_ids=()):
+        """
+        Streams the big input file into multiple small request files,
+        leaving out bundles whose id is in skip_ids.
+        Returns (request_files, bundle_offsets, dup_map) where bundle_offsets
+        maps each bundle id to its byte offset in the input, so results can be
+        joined back without holding every bundle in memory.
+
+        Bundles with identical scenario labels are only sent once; dup_map
+        maps each request's custom_id to every bundle id sharing its labels.
+        """
         if not os.path.exists(self.input_path):
             logger.error(f"Input file not found: {self.input_path}")
-            return False
-
-        logger.info("Reading input bundles...")
-
-        with open(self.input_path, "r", encoding="utf-8") as f:
-            all_bundles = [json.loads(line) for line in f if line.strip()]
+            return [], {}, {}
 
-        total_bundles = len(all_bundles)
-        total_batches = math.ceil(total_bundles / self.BATCH_SIZE)
-        
-        logger.info(f"Loaded {total_bundles} bundles. Splitting into {total_batches} batches of {self.BATCH_SIZE}.")
+        logger.info("Streaming input bundles...")
 
         generated_files = []
+        bundle_offsets = {}
+        dup_map = {}
+        count = 0
 
-
-        for i in range(total_batches):
-            start_idx = i * self.BATCH_SIZE # i=batch number
-            end_idx = start_idx + self.BATCH_SIZE
-            chunk = all_bundles[start_idx:end_idx]
-            
+        requests = self._iter_requests(skip_ids, bundle_offsets, dup_map)
+        # one request file per BATCH_SIZE requests, filled straight from the stream
+        for chunk in iter(lambda: list(islice(requests, self.BATCH_SIZE)), []):
             # Create a unique filename for this batch
-            batch_filename = f"{self.batch_dir}/{self.job_id_base}_req_part_{i+1}.jsonl"
-
-            with open(batch_filename, "w", encoding="utf-8") as f_out:
-                for bundle in chunk:
-                    scenario_text = (
-                        f"Bundle ID: {bundle['id']}\n"
-                        f"Crop: {bundle['crop']['label']}\n"
-                        f"Stage: {bundle['growth_stage']['label']}\n"
-                        f"Weather: {bundle['weather']['label']}\n"
-                        f"Stress: {bundle['stress']['label']}\n"
-                        f"Soil Type: {bundle['soil_type']['label']}\n"
-                        f"Region: {bundle['region']['label']}\n"
-                        f"Farming Practice: {bundle['farming_practice']['label']}"
-                    )
-
-                    prompt = f"""Analyze the scientific plausibility of the following agricultural scenario: {scenario_text}"""
-
-                    request_entry = {
-                        "custom_id": str(bundle["id"]),
-                        "request": {
-                            "contents": [{"parts": [{"text": prompt}]}],
-                            "generationConfig": {
-                                "responseMimeType": "application/json",
-                                "temperature": 0.0,
-                                "thinkingConfig": {
-                                    "includeThoughts": False,
-                                    "thinkingBudget": 0
-                                }
-                            },
-                            "systemInstruction": {
-                                "parts": [{"text": self.system_instruction}]
-                            }
-                        }
-                    }
-
-                    f_out.write(json.dumps(request_entry, ensure_ascii=False) + "\n")
-
+            batch_filename = f"{self.batch_dir}/{self.job_id_base}_req_part_{len(generated_files)+1}.jsonl"
+            with open(batch_filename, "wb") as f_out:
+                f_out.writelines(chunk)
             generated_files.append(batch_filename)
-            logger.info(f"Created batch file {i+1}/{total_batches}: {batch_filename} ({len(chunk)} items)")
+            count += len(chunk)
+            logger.info(f"Created batch file {len(generated_files)}: {batch_filename} ({len(chunk)} items)")
 
-        return generated_files, all_bundles
+        logger.info(f"Streamed {len(bundle_offsets)} bundles as {count} unique requests into {len(generated_files)} batches of {self.BATCH_SIZE}.")
+        return generated_files, bundle_offsets, dup_map
 
 
-    # SUBMIT & WAIT
-    def process_single_batch(self, request_file, batch_index, total_batches):
-        """Submits one batch file, waits, and downloads results."""
-        logger.info(f"--- Processing Batch {batch_index}/{total_batches} ---")
-        
-        logger.info(f"Uploading {request_file}...")
-        try:
-            batch_input_file = self.client.files.upload(
-                file=request_file,
-                config=types.UploadFileConfig(
-                    display_name=f"part_{batch_index}",
-                    mime_type="text/plain"
-                )
-            )
-        except Exception as e:
-            logger.error(f"Upload failed for batch {batch_index}: {e}")
-            return None
-
-        logger.info(f"Submitting Job for Batch {batch_index}...")
-
-        try:
-            job = self.client.batches.create(
-                model=self.model_name,
-                src=batch_input_file.name,
-                config={"display_name": f"{self.job_id_base}_part_{batch_index}"},
-            )
+    def _iter_requests(self, skip_ids, bundle_offsets, dup_map):
+        """
+        Yields one serialised request line per distinct scenario in the
+        input, recording offsets and duplicate groups as it goes.
+        """
+        seen = {}
+        with open(self.input_path, "rb") as f:
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                bundle = orjson.loads(line)
+                bid = str(bundle["id"])
+                if bid in skip_ids:
+                    continue
+                bundle_offsets[bid] = offset
 
-        except Exception as e:
-            logger.error(f"Job creation failed for batch {batch_index}: {e}")
-            return None
+                labels = tuple(bundle[key]["label"] for _, key in self._FIELDS)
+                rep_id = seen.get(labels)
+                if rep_id is not None:
+                    dup_map[rep_id].append(bid)
+                    continue
+                seen[labels] = bid
+                dup_map[bid] = [bid]
 
-        logger.info(f"Job {job.name} started. Waiting for completion...")
+                scenario_text = f"Bundle ID: {bundle['id']}\n" + "\n".join(
+                    f"{name}: {label}" for (name, _), label in zip(self._FIELDS, labels)
+                )
 
+                prompt = f"""Analyze the scientific plausibility of the following agricultural scenario: {scenario_text}"""
 
-        while True:
-            try:
-                job = self.client.batches.get(name=job.name)
+                request_entry = {
+                    "custom_id": bid,
+                    "request": {
+                        "contents": [{"parts": [{"text": prompt}]}],
+                        "generationConfig": self.generation_config,
+                        "systemInstruction": self.system_instruction_block,
+                    }
+                }
 
-                if job.state.name == "JOB_STATE_SUCCEEDED":
-                    logger.info(f"Batch {batch_index} COMPLETED.")
-                    break
-                elif job.state.name in ["JOB_STATE_FAILED", "JOB_STATE_CANCELLED"]:
-                    logger.error(f"Batch {batch_index} FAILED with status: {job.state.name}")
-                    if hasattr(job, 'error') and job.error:
-                        logger.error(f"Error details: {job.error.message}")
-                    return False
+                yield orjson.dumps(request_entry, option=orjson.OPT_APPEND_NEWLINE)
 
-                logger.info(f"Status: {job.state.name}... waiting 180s")
-                time.sleep(180)
 
-            except Exception as e:
-                logger.warning(f"Polling error (retrying): {e}")
-                time.sleep(60)
+    # SUBMIT & WAIT
+    async def process_single_batch(self, request_file, batch_index, total_batches):
+        """Submits one batch file, waits, and downloads results."""
+        logger.info(f"--- Processing Batch {batch_index}/{total_batches} ---")
+        job_name = await self.submit_batch(request_file, batch_index)
+        if not job_name:
+            return None
+        return await self.await_batch(job_name, request_file, batch_index)
 
+    async def submit_batch(self, request_file, batch_index):
+        """Uploads one batch file and creates its job. Returns the job name."""
+        return await self.runner.submit(
+            request_file, f"{self.job_id_base}_part_{batch_index}", f"batch {batch_index}"
+        )
 
+    async def await_batch(self, job_name, request_file, batch_index, grace=None):
+        """Polls a submitted job until it finishes, then downloads its results."""
         result_filename = request_file.replace("_req_", "_res_")
-
-        try:
-            content = self.client.files.download(file=job.dest.file_name)
-            with open(result_filename, "wb") as f:
-                f.write(content)
-            logger.info(f"Results downloaded to: {result_filename}")
-            return result_filename
-        except Exception as e:
-            logger.error(f"Failed to download results for batch {batch_index}: {e}")
-            return None
+        return await self.runner.wait(job_name, result_filename, f"batch {batch_index}", grace)
 
 
 
     # PARSE & SPLIT RESULTS
-    def parse_and_append_results(self, result_file, original_bundles_map):
-        """Parses a single result file and appends to the main output files."""
+    def _annotate(self, raw, confidence, idx):
+        bundle = orjson.loads(raw)
+        bundle.pop("validation_status", None)
+        bundle["validation_confidence"] = confidence
+        bundle["validation_label"] = self._LABELS[idx]
+        if idx == 0:
+            bundle["validation_status"] = "INVALID"
+        return orjson.dumps(bundle, option=orjson.OPT_APPEND_NEWLINE)
+
+    def parse_and_append_results(self, result_file, bundle_offsets, dup_map):
+        """
+        Parses a single result file and appends to the main output files.
+        Only the bundles referenced by this result file are read back from
+        the input, via their byte offsets; each decision is applied to every
+        bundle that shared the request (see dup_map).
+        """
         if not result_file or not os.path.exists(result_file):
             logger.warning("No result file to parse. Skipping.")
             return
@@ -210,14 +250,14 @@ class BatchValidator:
 
         validation_map = {}
 
-        with open(result_file, "r", encoding="utf-8") as f:
+        with open(result_file, "rb") as f:
             for line in f:
                 try:
-                    resp = json.loads(line)
+                    resp = orjson.loads(line)
                     # Handle cases where model might error on specific item
                     if "response" in resp and "candidates" in resp["response"]:
                         text = resp["response"]["candidates"][0]["content"]["parts"][0]["text"]
-                        parsed = json.loads(text)
+                        parsed = orjson.loads(text)
                         for k, v in parsed.items():
                             validation_map[str(k)] = v
                 except Exception:
@@ -225,77 +265,100 @@ class BatchValidator:
 
         logger.info(f"Loaded {len(validation_map)} validation responses.")
 
-        valid_cnt, weak_cnt, invalid_cnt, missed_cnt = 0, 0, 0, 0
-
-        with open(self.valid_output, "a", encoding="utf-8") as valid_out, \
-             open(self.weak_valid_output, "a", encoding="utf-8") as weak_out, \
-             open(self.invalid_output, "a", encoding="utf-8") as invalid_out:
+        counts = [0, 0, 0]
 
-            for bid, decision in validation_map.items():
-                bundle = original_bundles_map.get(bid)
-                if not bundle:
-                    continue # Should not happen if map is correct
+        # one buffer per label, indexed INVALID, WEAK_VALID, VALID; each is
+        # written out with a single write once the whole batch is classified
+        bufs = ([], [], [])
 
+        with open(self.input_path, "rb") as src:
 
-                confidence = decision.get("confidence", 0.0)
-
+            for rep_id, decision in validation_map.items():
                 try:
-                    confidence = float(confidence)
-                except (ValueError, TypeError):
+                    confidence = float(decision["confidence"])
+                except (KeyError, ValueError, TypeError):
                     confidence = 0.0
 
-                if confidence >= 0.50:
-                    label = "VALID"
-                elif confidence >= 0.30:
-                    label = "WEAK_VALID"
-                else:
-                    label = "INVALID"
-
-                bundle["validation_confidence"] = confidence
-                bundle["validation_label"] = label
-
-                if label == "VALID":
-                    valid_out.write(json.dumps(bundle, ensure_ascii=False) + "\n")
-                    valid_cnt += 1
-                elif label == "WEAK_VALID":
-                    weak_out.write(json.dumps(bundle, ensure_ascii=False) + "\n")
-                    weak_cnt += 1
-                else:
-                    bundle["validation_status"] = "INVALID"
-                    invalid_out.write(json.dumps(bundle, ensure_ascii=False) + "\n")
-                    invalid_cnt += 1
+                # 0 = INVALID, 1 = WEAK_VALID, 2 = VALID
+                idx = (confidence >= 0.30) + (confidence >= 0.50)
+                tail = b',"validation_confidence":' + orjson.dumps(confidence) + self._LABEL_SUFFIXES[idx]
+
+                for bid in dup_map.get(rep_id, (rep_id,)):
+                    offset = bundle_offsets.get(bid)
+                    if offset is None:
+                        continue # Should not happen if map is correct
+                    src.seek(offset)
+                    # splice the validation fields onto the raw line instead of
+                    # decoding and re-serialising the whole bundle
+                    raw = src.readline().rstrip()[:-1]
+                    if raw.endswith(b"{") or b'"validation_confidence":' in raw:
+                        # empty or already-annotated bundle: splicing would leave
+                        # a stray comma or duplicate keys, so go through a dict
+                        bufs[idx].append(self._annotate(raw + b"}", confidence, idx))
+                    else:
+                        bufs[idx].append(raw + tail)
+                    counts[idx] += 1
+
+        for path, buf in zip((self.invalid_output, self.weak_valid_output, self.valid_output), bufs):
+            if buf:
+                with open(path, "ab") as out:
+                    out.write(b"".join(buf))
 
         print("Batch Stats:")
-        print(f"Valid        : {valid_cnt}")
-        print(f"Weak_valid   : {weak_cnt}")
-        print(f"Invalid      : {invalid_cnt}")
+        print(f"Valid        : {counts[2]}")
+        print(f"Weak_valid   : {counts[1]}")
+        print(f"Invalid      : {counts[0]}")
 
 
 
-    def run_pipeline(self):
-        self.initialize_output_files()
-        request_files, all_bundles = self.create_batch_files()
+    def run_pipeline(self, reset=False):
+        self.initialize_output_files(reset)
+        done = set() if reset else self.load_classified_ids()
+        if done:
+            logger.info(f"Resuming: {len(done)} bundles already classified will be skipped.")
+        request_files, bundle_offsets, dup_map = self.create_batch_files(done)
         if not request_files:
             return
+        asyncio.run(self._run_batches(request_files, bundle_offsets, dup_map))
+        logger.info("ALL BATCHES PROCESSED.")
 
-        # Key: ID, Value: Bundle 
-        bundles_map = {str(b['id']): b for b in all_bundles}
-        
-        # Sequential process 
+    async def _run_batches(self, request_files, bundle_offsets, dup_map):
+        # Submit every batch up front, then wait on all jobs at once;
+        # results are parsed one at a time as each job finishes
         total = len(request_files)
-        for i, req_file in enumerate(request_files):
-            res_file = self.process_single_batch(req_file, i+1, total)
-            if res_file:
-                self.parse_and_append_results(res_file, bundles_map)
+        logger.info(f"--- Submitting {total} batches ---")
+        job_names = await asyncio.gather(*(
+            self.submit_batch(req_file, i+1) for i, req_file in enumerate(request_files)
+        ))
+
+        # fast polling after the first success applies to this run's jobs only
+        grace = asyncio.Event()
+        waits = []
+        for i, (req_file, job_name) in enumerate(zip(request_files, job_names)):
+            if job_name:
+                waits.append(self._await_indexed(job_name, req_file, i+1, grace))
             else:
                 logger.error(f"Skipping parsing for batch {i+1} due to failure.")
 
-        logger.info("ALL BATCHES PROCESSED.")
+        for next_done in asyncio.as_completed(waits):
+            idx, res_file = await next_done
+            if res_file:
+                self.parse_and_append_results(res_file, bundle_offsets, dup_map)
+            else:
+                logger.error(f"Skipping parsing for batch {idx} due to failure.")
+
+    async def _await_indexed(self, job_name, request_file, batch_index, grace=None):
+        return batch_index, await self.await_batch(job_name, request_file, batch_index, grace)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate bundles with Gemini batch jobs.")
+    parser.add_argument("--reset", action="store_true",
+                        help="discard previous results instead of resuming from them")
+    args = parser.parse_args()
+
     validator = BatchValidator()
-    validator.run_pipeline()
+    validator.run_pipeline(reset=args.reset)
 
 
 
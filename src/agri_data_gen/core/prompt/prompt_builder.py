@@ -1,5 +1,5 @@
-import json
-from typing import Dict, Any
+import orjson
+from typing import Dict, Any, Union
 
 
 class PromptBuilder:
@@ -7,19 +7,16 @@ class PromptBuilder:
     Builds prompts for generating Hindi agronomic reasoning examples.
     """
 
-    @staticmethod
-    def build(input_context: Dict[str, Any], record_id: int) -> str:
-        """
-        Convert the structured input into a complete LLM prompt.
-        """
-
-        prompt = f"""
+    # Fixed prompt text around the input block, stripped once at import
+    # so build() is a single concatenation per record.
+    _HEAD = """
                 Role: Expert Agricultural Advisor (Kisan Mitra).
                 Language: Hindi (Strictly).
                 
                 Input Data:
                 ```json
-                {input_context}
+                """.lstrip()
+    _TAIL = """
                 ```
                 
                 Task:
@@ -44,6 +41,14 @@ class PromptBuilder:
                 - Output strictly the advisory in hindi with proper utilisation of hindi words even for english terms.
                 - Use simple, clear Hindi suitable for farmers. Use bullet points for steps.
                 - Reference specific numbers from the input (e.g., "Since rainfall is 0mm...", etc).
-                """
+                """.rstrip()
 
-        return prompt.strip()
+    @staticmethod
+    def build(input_context: Union[Dict[str, Any], str], record_id: int) -> str:
+        """
+        Convert the structured input into a complete LLM prompt.
+        A dict context is rendered as indented JSON; a str is used as-is.
+        """
+        if not isinstance(input_context, str):
+            input_context = orjson.dumps(input_context, option=orjson.OPT_INDENT_2).decode()
+        return f"{PromptBuilder._HEAD}{input_context}{PromptBuilder._TAIL}"
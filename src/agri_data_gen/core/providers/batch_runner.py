@@ -0,0 +1,156 @@
+import random
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from google import genai
+from google.genai import types, errors
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRunner:
+    """
+    Runs JSONL request files through the Gemini batch API: upload, create the
+    job, poll it to completion and download the results.
+    Shared by BatchValidator and GeminiProvider.generate_batch().
+    """
+
+    # Polling: exponential backoff with jitter, capped; once any job in a set
+    # submitted together has succeeded the rest are likely close, so poll
+    # them quickly. The set shares one asyncio.Event passed as `grace`.
+    POLL_BASE = 15
+    POLL_CAP = 120
+    POLL_JITTER = 5
+    POLL_ERROR_BASE = 30
+    POLL_GRACE = 15
+    MAX_WAIT = 24 * 3600
+    # upload / create / download: bounded retries on transient errors
+    RETRY_ATTEMPTS = 3
+    RETRY_BASE = 2
+
+    def __init__(self, client: genai.Client, model_name: str):
+        self.client = client
+        self.model_name = model_name
+
+    async def run(self, request_file: str, result_file: str, display_name: str, label: str,
+                  grace: Optional[asyncio.Event] = None) -> Optional[str]:
+        """Submits one request file and waits for it. Returns the result file path."""
+        job_name = await self.submit(request_file, display_name, label)
+        if not job_name:
+            return None
+        return await self.wait(job_name, result_file, label, grace)
+
+    async def submit(self, request_file: str, display_name: str, label: str) -> Optional[str]:
+        """Uploads one request file and creates its job. Returns the job name."""
+        logger.info(f"Uploading {request_file}...")
+        try:
+            batch_input_file = await self._with_retry(
+                f"Upload of {label}",
+                self.client.aio.files.upload,
+                file=request_file,
+                config=types.UploadFileConfig(
+                    display_name=display_name,
+                    mime_type="text/plain"
+                )
+            )
+        except Exception as e:
+            logger.error(f"Upload failed for {label}: {e}")
+            return None
+
+        logger.info(f"Submitting Job for {label}...")
+
+        try:
+            job = await self._with_retry(
+                f"Job creation for {label}",
+                self.client.aio.batches.create,
+                model=self.model_name,
+                src=batch_input_file.name,
+                config={"display_name": display_name},
+            )
+
+        except Exception as e:
+            logger.error(f"Job creation failed for {label}: {e}")
+            return None
+
+        logger.info(f"Job {job.name} started.")
+        return job.name
+
+    async def wait(self, job_name: str, result_file: str, label: str,
+                   grace: Optional[asyncio.Event] = None) -> Optional[str]:
+        """
+        Polls a submitted job until it finishes, then downloads its results.
+        Jobs sharing a `grace` event switch to POLL_GRACE once one of them
+        succeeds; without one, polling always backs off.
+        """
+        logger.info(f"Waiting for {label} ({job_name})...")
+
+        deadline = time.monotonic() + self.MAX_WAIT
+        attempt, failures = 0, 0
+        while True:
+            if time.monotonic() > deadline:
+                logger.error(f"{label} did not finish within {self.MAX_WAIT}s. Giving up.")
+                return None
+            try:
+                job = await self.client.aio.batches.get(name=job_name)
+                failures = 0
+
+                if job.state.name == "JOB_STATE_SUCCEEDED":
+                    logger.info(f"{label} COMPLETED.")
+                    if grace is not None:
+                        grace.set()
+                    break
+                elif job.state.name in ["JOB_STATE_FAILED", "JOB_STATE_CANCELLED"]:
+                    logger.error(f"{label} FAILED with status: {job.state.name}")
+                    if hasattr(job, 'error') and job.error:
+                        logger.error(f"Error details: {job.error.message}")
+                    return None
+
+                if grace is not None and grace.is_set():
+                    delay = self.POLL_GRACE
+                else:
+                    delay = min(self.POLL_CAP, self.POLL_BASE * 2 ** attempt)
+                    attempt += 1
+                delay += random.uniform(0, self.POLL_JITTER)
+                logger.info(f"{label} status: {job.state.name}... waiting {delay:.0f}s")
+                await asyncio.sleep(delay)
+
+            except Exception as e:
+                delay = min(self.POLL_CAP, self.POLL_ERROR_BASE * 2 ** failures) + random.uniform(0, self.POLL_JITTER)
+                failures += 1
+                logger.warning(f"Polling error (retrying in {delay:.0f}s): {e}")
+                await asyncio.sleep(delay)
+
+        try:
+            # streamed straight to disk in chunks, never held in memory whole
+            await self._with_retry(
+                f"Download of {label}",
+                self.client.aio.files.download,
+                file=job.dest.file_name,
+                destination=result_file,
+            )
+            logger.info(f"Results downloaded to: {result_file}")
+            return result_file
+        except Exception as e:
+            logger.error(f"Failed to download results for {label}: {e}")
+            return None
+
+    @staticmethod
+    def _is_transient(e):
+        """5xx, 429 and timeouts are worth retrying; anything else is not."""
+        if isinstance(e, (errors.ServerError, TimeoutError, asyncio.TimeoutError)):
+            return True
+        return isinstance(e, errors.ClientError) and e.code == 429
+
+    async def _with_retry(self, what, fn, *args, **kwargs):
+        """Awaits fn(*args, **kwargs), retrying transient errors with backoff."""
+        for attempt in range(1, self.RETRY_ATTEMPTS + 1):
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.RETRY_ATTEMPTS or not self._is_transient(e):
+                    raise
+                delay = self.RETRY_BASE ** attempt + random.random()
+                logger.warning(f"{what} failed (attempt {attempt}/{self.RETRY_ATTEMPTS}, retrying in {delay:.0f}s): {e}")
+                await asyncio.sleep(delay)
@@ -1,35 +1,128 @@
 import os
+import time
+import orjson
+import asyncio
+from typing import Any, Dict, Iterable, List, Optional
 from google.genai import types
 from google import genai
 from dotenv import load_dotenv
 
+from agri_data_gen.core.providers.batch_runner import BatchRunner
+
 
 load_dotenv()
 
+# one SDK client (and its connection pool) per API key, shared by every provider
+_CLIENTS: Dict[str, genai.Client] = {}
+
+
+def _get_client(api_key: str) -> genai.Client:
+    client = _CLIENTS.get(api_key)
+    if client is None:
+        client = _CLIENTS[api_key] = genai.Client(api_key=api_key)
+    return client
+
+
 class GeminiProvider:
     """
     Minimal wrapper around Gemini 2.5 Flash.
     Call:   GeminiProvider().generate(prompt)
+    Async:  await GeminiProvider().agenerate(prompt)
+    Many:   await GeminiProvider().agenerate_many(prompts, concurrency=16)
+    Bulk:   GeminiProvider().generate_batch({custom_id: prompt, ...})
     """
 
     def __init__(self, model_name: str = "models/gemini-2.5-flash"):
         api_key = os.getenv("GOOGLE_API_KEY_2")
         if not api_key:
             raise RuntimeError("Set GOOGLE_API_KEY env var first.")
-        self.client = genai.Client(api_key=api_key)
+        self.client = _get_client(api_key)
         self.model_name = model_name
+        self.config = types.GenerateContentConfig(
+            temperature=0.7,
+            response_mime_type="application/json",
+            thinking_config=types.ThinkingConfig(
+                include_thoughts=True,
+                thinking_budget= 2048
+            )
+        )
         
     def generate(self, prompt: str) -> str:
         response = self.client.models.generate_content(
                     model=self.model_name,
                     contents=prompt,
-                    config=types.GenerateContentConfig(
-                        temperature=0.7,
-                        response_mime_type="application/json",
-                        thinking_config=types.ThinkingConfig(
-                            include_thoughts=True,
-                            thinking_budget= 2048
-                        )
-                    )
+                    config=self.config
                 )        
         return response.model_dump()
+
+    async def agenerate(self, prompt: str) -> Dict[str, Any]:
+        """Non-blocking variant of generate() using the SDK's async client."""
+        response = await self.client.aio.models.generate_content(
+                    model=self.model_name,
+                    contents=prompt,
+                    config=self.config
+                )
+        return response.model_dump()
+
+    async def agenerate_many(self, prompts: Iterable[str], concurrency: int = 16) -> List[Dict[str, Any]]:
+        """
+        Runs agenerate() over many prompts with at most `concurrency` requests
+        in flight. Results are returned in prompt order.
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(prompt):
+            async with sem:
+                return await self.agenerate(prompt)
+
+        return await asyncio.gather(*map(one, prompts))
+
+    def generate_batch(self, prompts: Dict[str, str], system_instruction: Optional[str] = None,
+                       work_dir: str = "data/batch") -> Dict[str, str]:
+        """Blocking wrapper around agenerate_batch()."""
+        return asyncio.run(self.agenerate_batch(prompts, system_instruction, work_dir))
+
+    async def agenerate_batch(self, prompts: Dict[str, str], system_instruction: Optional[str] = None,
+                              work_dir: str = "data/batch") -> Dict[str, str]:
+        """
+        Sends {custom_id: prompt} through the Gemini batch API instead of one
+        generate_content call per prompt; cheaper and higher throughput when
+        there are many prompts, at the cost of latency.
+        Returns {custom_id: response text} for every request that succeeded.
+        """
+        os.makedirs(work_dir, exist_ok=True)
+        job_base = f"gen_job_{int(time.time())}"
+        request_file = f"{work_dir}/{job_base}_req.jsonl"
+        result_file = f"{work_dir}/{job_base}_res.jsonl"
+
+        # the batch file takes the REST (camelCase) form of the same config
+        request = {"generationConfig": self.config.model_dump(mode="json", by_alias=True, exclude_none=True)}
+        if system_instruction:
+            request["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+
+        with open(request_file, "wb") as f:
+            for custom_id, prompt in prompts.items():
+                entry = {
+                    "custom_id": str(custom_id),
+                    "request": {"contents": [{"parts": [{"text": prompt}]}], **request},
+                }
+                f.write(orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE))
+
+        runner = BatchRunner(self.client, self.model_name)
+        if not await runner.run(request_file, result_file, job_base, job_base):
+            raise RuntimeError(f"Batch job {job_base} did not complete.")
+
+        results = {}
+        with open(result_file, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                resp = orjson.loads(line)
+                try:
+                    parts = resp["response"]["candidates"][0]["content"]["parts"]
+                except (KeyError, IndexError, TypeError):
+                    continue # this request errored; leave it out
+                results[resp.get("custom_id") or resp.get("key")] = "".join(
+                    p.get("text", "") for p in parts if not p.get("thought")
+                )
+        return results
@@ -1,17 +1,25 @@
 import time
 import sys
-import json
+import asyncio
+import orjson
 import os
+import mmap
+import struct
+import zlib
 # import yaml
 import itertools
-import random
+import argparse
+import collections
+import numpy as np
 import glob
 import logging
 from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 from pathlib import Path
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+from agri_data_gen.core.providers.batch_runner import BatchRunner
 from agri_data_gen.gemini_batch_processing.parser import extract
 
 
@@ -19,37 +27,125 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class _DisplayKeys(dict):
+    """bundle key -> prompt heading ("soil_type" -> "Soil Type"), filled on first use."""
+
+    def __missing__(self, key):
+        value = self[key] = key.replace("_", " ").title()
+        return value
+
+
+def _prompt_text(data_bundle, display):
+    return "\n".join(
+        f"{display[k]}: {v['label']}"
+        for k, v in data_bundle.items()
+        if isinstance(v, dict) and "label" in v
+    )
+
+
+def _serialize_requests(lines, done, sys_texts, display, rng):
+    """
+    Turns raw bundle lines into request lines, skipping malformed ones.
+    `done` is how many requests precede these, for fallback custom ids.
+    """
+    requests = []
+    # one vectorised draw of system instruction picks for the whole chunk
+    picks = rng.integers(0, len(sys_texts), size=len(lines)).tolist()
+    for line, pick in zip(lines, picks):
+        if line.isspace():
+            continue
+        try:
+            bundle = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue
+
+        # Logic: Generate Request Object
+        custom_id = bundle.get('id', f"req_{done + len(requests) + 1}")
+        # plain string; it is JSON-quoted once, with the rest of the request
+        prompt_text = _prompt_text(bundle, display)
+        sys_instruction_text = sys_texts[pick]
+
+        # only the three strings vary; splice them into the fixed skeleton
+        requests.append(b"".join((
+            TextBatchJob._REQ_PREFIX, orjson.dumps(str(custom_id)),
+            TextBatchJob._REQ_PROMPT, orjson.dumps(prompt_text),
+            TextBatchJob._REQ_SYSTEM, orjson.dumps(sys_instruction_text),
+            TextBatchJob._REQ_SUFFIX,
+        )))
+    return requests
+
+
+# Process-pool helpers for TextBatchJob._iter_request_chunks; the system
+# instruction texts are sent once per worker instead of with every chunk.
+_WORKER_SYS_TEXTS = None
+_WORKER_DISPLAY_KEYS = None
+_WORKER_RNG = None
+
+
+def _init_request_worker(sys_texts):
+    global _WORKER_SYS_TEXTS, _WORKER_DISPLAY_KEYS, _WORKER_RNG
+    _WORKER_SYS_TEXTS = sys_texts
+    _WORKER_DISPLAY_KEYS = _DisplayKeys()
+    # fresh OS entropy, so forked workers don't share one instruction sequence
+    _WORKER_RNG = np.random.default_rng()
+
+
+def _serialize_request_chunk(args):
+    line_no, lines = args
+    return _serialize_requests(lines, line_no, _WORKER_SYS_TEXTS, _WORKER_DISPLAY_KEYS, _WORKER_RNG)
+
+
 class TextBatchJob:
-    def __init__(self, job_name="agri-advisory-job", api_key=None):
+    # Fixed JSON around the per-request strings; together with the three
+    # orjson-quoted fields this is exactly orjson.dumps() of the request dict.
+    _GENERATION_CONFIG = {
+        "responseMimeType": "text/plain",
+        "temperature": 0.2,
+        "thinkingConfig": {
+            "includeThoughts": True,
+            "thinkingBudget": 2048
+        },
+    }
+    _REQ_PREFIX = b'{"custom_id":'
+    _REQ_PROMPT = b',"request":{"contents":[{"parts":[{"text":'
+    _REQ_SYSTEM = b'}]}],"system_instruction":{"parts":[{"text":'
+    _REQ_SUFFIX = b'}]},"generationConfig":' + orjson.dumps(_GENERATION_CONFIG) + b'}}\n'
+
+    PARALLEL_CHUNK_LINES = 5_000
+
+    def __init__(self, job_name="agri-advisory-job", api_key=None, workers=1):
         
         self.api_key = api_key if api_key else os.getenv('GOOGLE_API_KEY_SOKET')
         
         self.model_name = "models/gemini-2.5-flash"
         self.client = genai.Client(api_key=self.api_key)  
+        self.runner = BatchRunner(self.client, self.model_name)
         self.job_name = job_name
         self.job_base_id = f"{job_name}_{int(time.time())}"
         self.output_dir = f"output/{self.job_base_id}"
         self.sys_instructions = self.load_system_instructions("data/sys_instructions/system_instructions.jsonl")
+        # just the texts, so picking one per request is a single list index
+        self._sys_instruction_texts = [o['system_instruction'] for o in self.sys_instructions]
         
         self.MAX_TOKENS_PER_BATCH = 2_500_000  # Safe Limit
-        self.EST_TOKENS_PER_REQ = 650         
-        self.MAX_REQS_PER_BATCH = self.MAX_TOKENS_PER_BATCH // self.EST_TOKENS_PER_REQ 
+        # batches are closed on the serialised size of what they hold
+        # (~4 bytes per token), with a request-count cap as a backstop
+        self.BYTES_PER_TOKEN = 4
+        self.MAX_REQS_PER_BATCH = 20_000
+        # each batch is sized to the per-job token budget, so only a couple run at once
+        self.MAX_CONCURRENT_JOBS = 2
         
         self.cursor_file = "data/cursor.txt"  #state file
+        self.workers = workers  # >1 serialises requests in a process pool
+        self._display_keys = _DisplayKeys()
+        self._rng = np.random.default_rng()
 
     def prepare_prompt(self, data_bundle):
         """
         Converts the data bundle into a clean, natural language string 
         suitable for PDF rendering and easier LLM reading.
         """
-        lines = []
-        for k, v in data_bundle.items():
-            if isinstance(v, dict) and "label" in v:
-                key = k.replace("_", " ").title()
-                value = v["label"]
-                lines.append(f"{key}: {value}")
-        
-        return "\n".join(lines)
+        return _prompt_text(data_bundle, self._display_keys)
 
 
     def load_system_instructions(self, filepath):
@@ -59,20 +155,19 @@ class TextBatchJob:
             logger.error(f"System instruction file not found: {filepath}")
             raise FileNotFoundError(f"{filepath} not found.")
             
-        with open(filepath, 'r', encoding='utf-8') as f:
+        with open(filepath, 'rb') as f:
             for line in f:
                 if line.strip():
-                    instructions.append(json.loads(line))
+                    instructions.append(orjson.loads(line))
         logger.info(f"Loaded {len(instructions)} system instructions.")
         return instructions
 
     def get_random_system_instruction(self):
-        """Picks one random instruction object from the loaded list."""
-        if not self.sys_instructions:
+        """Picks one random instruction text from the loaded list."""
+        if not self._sys_instruction_texts:
              raise ValueError("System instructions list is empty!")
-        
-        selected_obj = random.choice(self.sys_instructions)
-        return selected_obj['system_instruction']
+
+        return self._sys_instruction_texts[self._rng.integers(len(self._sys_instruction_texts))]
 
 
 
@@ -87,9 +182,84 @@ class TextBatchJob:
             return 0
 
     def _update_cursor(self, new_index):
-        """Updates the cursor file with the new index."""
-        with open(self.cursor_file, 'w') as f:
+        """
+        Updates the cursor file with the new index. Written to a temp file
+        and renamed over the old one, so a crash never leaves it truncated
+        (which would silently restart from 0).
+        """
+        tmp = self.cursor_file + ".tmp"
+        with open(tmp, 'w') as f:
             f.write(str(new_index))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.cursor_file)
+
+    # sparse line index: byte offset of every LINE_INDEX_STRIDE-th line, in a
+    # sidecar keyed by the input's size and mtime, plus a checksum of the
+    # indexed file's last bytes so a grown file can be told from a rewritten one
+    LINE_INDEX_STRIDE = 10_000
+    _LINE_INDEX_HEADER = struct.Struct("<QqQI")  # size, mtime_ns, stride, tail crc32
+    _LINE_INDEX_TAIL = 4096
+
+    def _seek_to_line(self, infile, input_file_path, line_no):
+        """
+        Positions infile at the nearest indexed line at or before line_no.
+        Returns how many lines are still left to skip from there.
+        """
+        if line_no <= 0:
+            return 0
+        offsets = self._load_line_index(input_file_path)
+        slot = min(line_no // self.LINE_INDEX_STRIDE, len(offsets) - 1)
+        infile.seek(offsets[slot])
+        return line_no - slot * self.LINE_INDEX_STRIDE
+
+    def _tail_crc(self, f, size):
+        """crc32 of the last _LINE_INDEX_TAIL bytes of the first `size` bytes of f."""
+        start = max(0, size - self._LINE_INDEX_TAIL)
+        f.seek(start)
+        return zlib.crc32(f.read(size - start))
+
+    def _load_line_index(self, input_file_path):
+        st = os.stat(input_file_path)
+        index_path = input_file_path + ".offsets"
+        offsets, pos, line = array('Q', [0]), 0, 0
+        with open(input_file_path, 'rb') as infile:
+            try:
+                with open(index_path, 'rb') as f:
+                    raw = f.read()
+                size, mtime_ns, stride, crc = self._LINE_INDEX_HEADER.unpack_from(raw)
+                if (stride == self.LINE_INDEX_STRIDE and size <= st.st_size
+                        and self._tail_crc(infile, size) == crc):
+                    stored = array('Q')
+                    stored.frombytes(raw[self._LINE_INDEX_HEADER.size:])
+                    if (size, mtime_ns) == (st.st_size, st.st_mtime_ns):
+                        return stored
+                    # the file grew since it was indexed (bundles are appended
+                    # between runs): keep the offsets, index only from the last one
+                    offsets, pos = stored, stored[-1]
+                    line = (len(stored) - 1) * self.LINE_INDEX_STRIDE
+            except (OSError, struct.error, ValueError, IndexError):
+                pass
+
+            logger.info(f"Building line index for {input_file_path} from byte {pos}...")
+            if st.st_size:
+                with mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    while True:
+                        pos = mm.find(b"\n", pos) + 1
+                        if not pos:
+                            break
+                        line += 1
+                        if line % self.LINE_INDEX_STRIDE == 0:
+                            offsets.append(pos)
+            header = (st.st_size, st.st_mtime_ns, self.LINE_INDEX_STRIDE,
+                      self._tail_crc(infile, st.st_size))
+        try:
+            with open(index_path, 'wb') as f:
+                f.write(self._LINE_INDEX_HEADER.pack(*header))
+                f.write(offsets.tobytes())
+        except OSError as e:
+            logger.warning(f"Could not save line index {index_path}: {e}")
+        return offsets
 
 
     def create_jsonl_batches(self, input_file_path: str= "data/bundles/bundles.jsonl"):
@@ -108,124 +278,162 @@ class TextBatchJob:
         logger.info(f"Reading from {input_file_path}...")
         
         created_files = []
+        # cursor position once each created file has been processed
+        batch_ends = []
         current_batch_reqs = []
         total_processed = 0
+        closed = 0
+
+        if not self._sys_instruction_texts:
+            raise ValueError("System instructions list is empty!")
         batch_counter = 1
+        # finished batches are written on a background thread while the
+        # next one is being built; the writes are all checked before returning
+        writes = []
         
-        with open(input_file_path, 'r', encoding='utf-8') as infile:
+        with open(input_file_path, 'rb') as infile, ThreadPoolExecutor(max_workers=1) as writer:
             
-            # 2. Efficiently Skip 'start_index' lines (skip already processed lines)
-            iterator = itertools.islice(infile, start_index, None)
-
-            for line in iterator:
-                try:
-                    bundle = json.loads(line.strip())
-                    total_processed += 1
-
-                    # Logic: Generate Request Object
-                    custom_id = bundle.get('id', f"req_{start_index + total_processed}")
-                    # prompt_text = json.dumps(self.prepare_prompt(bundle)) #,  ensure_ascii=False) #json dump to parse into string - save token 
-                    prompt_text = self.prepare_prompt(bundle)
-                    sys_instruction_text = self.get_random_system_instruction()
-
-                    request_entry = {
-                        "custom_id": str(custom_id), 
-                        "request": { 
-                            "contents": [{"parts": [{"text": prompt_text}]} ],
-                            "system_instruction": { "parts": [{"text": sys_instruction_text}] },
-                            "generationConfig": {
-                                "responseMimeType": "text/plain", 
-                                "temperature": 0.2,
-                                "thinkingConfig": { 
-                                    "includeThoughts": True,
-                                    "thinkingBudget": 2048
-                                },
-                            }
-                        }
-                    }
-
-                    current_batch_reqs.append(request_entry)
-                    
-                    # Check if batch is full
-                    if len(current_batch_reqs) >= self.MAX_REQS_PER_BATCH:
+            # 2. Efficiently Skip 'start_index' lines (skip already processed lines):
+            #    seek via the line index, then step over the few lines left
+            residual = self._seek_to_line(infile, input_file_path, start_index)
+            iterator = itertools.islice(infile, residual, None)
+
+            max_bytes = self.MAX_TOKENS_PER_BATCH * self.BYTES_PER_TOKEN
+            current_bytes = 0
+            for requests in self._iter_request_chunks(iterator, start_index):
+                total_processed += len(requests)
+                for req in requests:
+                    # Check if batch is full: this request would push it past
+                    # the size budget, or it already holds the most allowed
+                    if current_batch_reqs and (current_bytes + len(req) > max_bytes
+                                               or len(current_batch_reqs) >= self.MAX_REQS_PER_BATCH):
                         batch_filename = f"{self.output_dir}/batch_part_{batch_counter:03d}.jsonl"
-                        self._write_batch_file(batch_filename, current_batch_reqs)
+                        writes.append(writer.submit(self._write_batch_file, batch_filename, current_batch_reqs))
                         created_files.append(batch_filename)
-                        
+                        closed += len(current_batch_reqs)
+                        batch_ends.append(start_index + closed)
+
                         # Reset for next batch
                         current_batch_reqs = []
+                        current_bytes = 0
                         batch_counter += 1
 
-                except json.JSONDecodeError:
-                    continue
+                    current_batch_reqs.append(req)
+                    current_bytes += len(req)
 
             # Write remaining requests if any
             if current_batch_reqs:
                 batch_filename = f"{self.output_dir}/batch_part_{batch_counter:03d}.jsonl"
-                self._write_batch_file(batch_filename, current_batch_reqs)
+                writes.append(writer.submit(self._write_batch_file, batch_filename, current_batch_reqs))
                 created_files.append(batch_filename)
+                closed += len(current_batch_reqs)
+                batch_ends.append(start_index + closed)
+
+        for write in writes:
+            write.result()  # re-raises a failed write
         
         if total_processed == 0:
             logger.info("No new records found. The job is complete!")
             return None 
 
         logger.info(f"Created {len(created_files)} batch files containing {total_processed} requests.")
-        return created_files, (start_index + total_processed)
+        return created_files, (start_index + total_processed), batch_ends
+
 
+    def _iter_request_chunks(self, lines, start_index):
+        """
+        Yields lists of serialised request lines, PARALLEL_CHUNK_LINES input
+        lines at a time, in input order. With workers > 1 the chunks are
+        serialised in a process pool.
+        """
+        def chunks():
+            line_no = start_index
+            while True:
+                chunk = list(itertools.islice(lines, self.PARALLEL_CHUNK_LINES))
+                if not chunk:
+                    return
+                yield line_no, chunk
+                line_no += len(chunk)
+
+        if self.workers <= 1:
+            done = start_index
+            for _, chunk in chunks():
+                requests = _serialize_requests(chunk, done, self._sys_instruction_texts,
+                                               self._display_keys, self._rng)
+                done += len(requests)
+                yield requests
+            return
+
+        # fallback ids in a worker count input lines rather than parsed
+        # records; the two only differ when the input has malformed lines
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_request_worker,
+                                 initargs=(self._sys_instruction_texts,)) as ex:
+            # a bounded window of chunks in flight; ex.map() would submit (and
+            # so read) the whole remaining input before yielding anything
+            pending = collections.deque()
+            for args in chunks():
+                pending.append(ex.submit(_serialize_request_chunk, args))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
 
     def _write_batch_file(self, filename, requests):
-        with open(filename, 'w', encoding='utf-8') as f:
-            for req in requests:
-                f.write(json.dumps(req, ensure_ascii=False) + "\n")
+        """Writes already-serialised request lines to one batch file."""
+        with open(filename, 'wb', buffering=1 << 20) as f:
+            f.writelines(requests)
         logger.info(f"Saved: {filename} ({len(requests)} items)")
 
 
 
     def submit_wait_download(self, file_path):
-        """Uploads the JSONL and starts the Batch Job"""
-        logger.info(f"--- Processing {os.path.basename(file_path)} ---")
-        logger.info("Uploading JSONL file to Gemini...")
-        batch_input_file = self.client.files.upload(
-            file=file_path,
-            config=types.UploadFileConfig(display_name=Path(file_path).stem, mime_type="text/plain")
-        )
-        
-        logger.info(f"File uploaded: {batch_input_file.name}. Starting Batch Job...")
-        logger.info("Submitting Job...")
-
-        job = self.client.batches.create( 
-            model=self.model_name,
-            src=batch_input_file.name,
-            config={
-                'display_name': f"{self.job_base_id}_{Path(file_path).stem}"
-            },
-        )
-        
-        logger.info(f"Batch Job Created: {job.name}")
-
-
-        #wait
-        logger.info("Waiting for completion...")
-        while True:
-            job_status = self.client.batches.get(name=job.name)
-            state = job_status.state.name 
-            logger.info(f"Job Status: {state}")
-            
-            if state == "JOB_STATE_SUCCEEDED":
-                break
-            elif state in ["JOB_STATE_FAILED", "JOB_STATE_CANCELLED"]:
-                logger.error("Job Failed.")
-                return False
-        
-            time.sleep(180) 
-            print("waiting for 180")
-
-        #download
-        output_file_name = job_status.dest.file_name
-        logger.info(f"Downloading results from {output_file_name}...")
+        """Uploads one JSONL, runs its Batch Job and downloads the results."""
+        return asyncio.run(self.process_files([file_path])) == 1
 
-        content = self.client.files.download(file=output_file_name)
+    async def process_files(self, files, batch_ends=None):
+        """
+        Runs the files' batch jobs in order, at most MAX_CONCURRENT_JOBS at a
+        time, and stops submitting new ones after the first failure.
+        With batch_ends (the cursor position after each file) the cursor is
+        moved past the contiguous run of finished files as it grows, so a
+        later failure never re-submits jobs that already completed.
+        Returns how many completed and were downloaded.
+        """
+        slots = asyncio.Semaphore(self.MAX_CONCURRENT_JOBS)
+        finished = [False] * len(files)
+        failed = False
+        prefix = 0
+
+        async def run(i, file_path):
+            nonlocal failed, prefix
+            async with slots:
+                if failed:
+                    return
+                job_name = await self.upload_and_submit(file_path)
+                ok = bool(job_name) and await self.wait_and_download(job_name, file_path)
+            if not ok:
+                if not failed:
+                    logger.error(f"Failed to process {file_path}. Stopping pipeline.")
+                failed = True
+                return
+            finished[i] = True
+            advanced = prefix
+            while prefix < len(files) and finished[prefix]:
+                prefix += 1
+            if batch_ends and prefix > advanced:
+                self._update_cursor(batch_ends[prefix - 1])
+
+        await asyncio.gather(*(run(i, f) for i, f in enumerate(files)))
+        return sum(finished)
+
+    async def upload_and_submit(self, file_path):
+        """Uploads the JSONL and starts the Batch Job. Returns the job name."""
+        logger.info(f"--- Processing {os.path.basename(file_path)} ---")
+        # upload and create retry transient errors; shared with BatchValidator
+        return await self.runner.submit(file_path, f"{self.job_base_id}_{Path(file_path).stem}", Path(file_path).stem)
 
+    async def wait_and_download(self, job_name, file_path):
+        """Waits for a submitted job, then downloads its results next to file_path."""
         input_path = Path(file_path)
         # Create 'output' folder inside the input directory
         results_dir = input_path.parent / "output"
@@ -235,9 +443,12 @@ class TextBatchJob:
         res_filename = f"{input_path.stem}_results.jsonl"
         res_path = results_dir / res_filename
 
-        with open(res_path, 'wb') as f:
-            f.write(content)
-            
+        # backoff polling and streamed download shared with BatchValidator. No
+        # grace event: jobs here start over hours as slots free up, so one
+        # finishing says nothing about how close the others are.
+        if not await self.runner.wait(job_name, str(res_path), input_path.stem, grace=None):
+            return False
+
         # Parse and Separate Files
         # extract(str(res_path))
         logger.info(f"Batch Complete. Results at {res_path}")
@@ -248,7 +459,12 @@ class TextBatchJob:
 
 
 if __name__ == "__main__":
-    processor = TextBatchJob()
+    parser = argparse.ArgumentParser(description="Build and run Gemini batch jobs for new bundles.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to serialise requests (default: 1)")
+    args = parser.parse_args()
+
+    processor = TextBatchJob(workers=args.workers)
     
     result = processor.create_jsonl_batches("data/bundles/bundles.jsonl")
     
@@ -257,23 +473,15 @@ if __name__ == "__main__":
         sys.exit(0)
     
     # Now it is safe to unpack
-    files, final_cursor_pos = result
+    files, final_cursor_pos, batch_ends = result
     
-    print(f"Plan: Process {len(files)} batch files sequentially.")
+    print(f"Plan: Process {len(files)} batch files, {processor.MAX_CONCURRENT_JOBS} at a time.")
     
-    # Process Sequentially
-    success_count = 0
-    for f in files:
-        if processor.submit_wait_download(f):
-            success_count += 1
-            time.sleep(30)
-        else:
-            logger.error(f"Failed to process {f}. Stopping pipeline.")
-            break
+    # The cursor moves past each finished prefix of files as the jobs complete
+    success_count = asyncio.run(processor.process_files(files, batch_ends))
             
-    # Update Cursor
     if success_count == len(files):
-        processor._update_cursor(final_cursor_pos)
         print("All batches processed successfully! Cursor updated.")
     else:
-        print(f"Pipeline stopped. Processed {success_count}/{len(files)} batches.")
\ No newline at end of file
+        print(f"Pipeline stopped. Processed {success_count}/{len(files)} batches; "
+              f"cursor at {processor._get_start_index()}.")
@@ -1,11 +1,17 @@
+import argparse
+import collections
+import functools
+import io
+import itertools
 import json
-import pandas as pd
+import pyarrow.parquet as pq
 import os
 import re
-from docx import Document
-from docx.shared import Pt, RGBColor, Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
+import shutil
+import subprocess
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
 
@@ -18,8 +24,44 @@ OUTPUT_PDF = os.path.abspath("final_report_styled.pdf")
 FONT_ENGLISH = 'Calibri'
 FONT_HINDI = 'Noto Sans Devanagari' 
 
+# fields of a parsed record that end up in the report
+ENTRY_COLUMNS = ("custom_id", "system_instruction", "prompt", "thoughts", "advisory")
+
+# compiled once; these run for every line of every entry
+_DEVANAGARI = re.compile(r'[\u0900-\u097F]')
+_BOLD_SPLIT = re.compile(r'(\*\*.*?\*\*)')
+_RUN_SPECIALS = re.compile(r'([\t\n\r])')
+# characters outside the XML 1.0 Char production; Word refuses a document.xml that contains any
+_XML_ILLEGAL = re.compile('[^\t\n\r\u0020-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+# The report body is written as WordprocessingML strings; python-docx only
+# provides the empty template package around word/document.xml.
+DOCUMENT_XML = 'word/document.xml'
+# markdown line prefix -> (paragraph style, prefix length); keys are 2 or 3 chars
+_LINE_STYLES = {
+    '# ': ('Heading 3', 2),  # Map # to H3 for sizing reasons
+    '## ': ('Heading 4', 3),
+    '* ': ('List Bullet', 2),
+    '- ': ('List Bullet', 2),
+    '• ': ('List Bullet', 2),
+}
+# paragraph style ids in python-docx's default template
+STYLE_IDS = {'Heading 3': 'Heading3', 'Heading 4': 'Heading4', 'List Bullet': 'ListBullet'}
+_CENTER = '<w:jc w:val="center"/>'
+_SEPARATOR = f'<w:p><w:pPr>{_CENTER}</w:pPr><w:r><w:t>{"_" * 90}</w:t></w:r></w:p>'
+_PAGE_BREAK = '<w:p><w:r><w:br w:type="page"/></w:r></w:p>'
+# run colours as <w:color> hex values
+COLOR_KEY = "3C3C3C"        # Dark Gray
+COLOR_HEADING = "646464"
+COLOR_SYSTEM = "696969"
+COLOR_RECORD = "003366"     # Navy Blue
+COLOR_THOUGHTS = "C86400"   # Orange
+COLOR_ADVISORY = "008000"   # Green
+# entries per rendered fragment, and per task when rendering in a process pool
+RENDER_CHUNK_ENTRIES = 500
+
 def contains_devanagari(text):
-    return any('\u0900' <= c <= '\u097F' for c in text)
+    return _DEVANAGARI.search(text) is not None
 
 def clean_text(text):
     """
@@ -28,77 +70,110 @@ def clean_text(text):
     if not text: return "N/A"
     text = str(text)
     text = text.replace('\\n', '\n').replace('<br>', '\n')
-    # Remove wrapper artifacts
-    text = text.replace("```json", "").replace("```markdown", "").replace("```", "")
+    # Remove wrapper artifacts (most entries have none, so check once first)
+    if "```" in text:
+        text = text.replace("```json", "").replace("```markdown", "").replace("```", "")
     return text.strip()
 
 def iter_entries(input_path):
     ext = os.path.splitext(input_path)[1].lower()
     if ext == ".jsonl":
-        with open(input_path, "r", encoding="utf-8") as f:
+        with open(input_path, "rb", buffering=1 << 16) as f:
             for line in f:
-                yield json.loads(line)
+                if line.strip():
+                    yield json.loads(line)
     else:
-        df = pd.read_parquet(input_path)
-        for record in df.to_dict(orient="records"):
-            yield record
-
-def format_run(run, text, bold=False, italic=False, size=11, color=None):
-    """Applies font, size, language settings, and bold/italic."""
-    run.font.size = Pt(size)
-    run.bold = bold
-    run.italic = italic
-    if color: 
-        run.font.color.rgb = color
-    
+        # one record batch at a time, decoding only the columns add_entry reads
+        pf = pq.ParquetFile(input_path)
+        cols = [c for c in ENTRY_COLUMNS if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=1024, columns=cols):
+            yield from batch.to_pylist()
+
+def _text_xml(text):
+    """<w:t> content of a run; tabs and line breaks become <w:tab/> and <w:br/> like python-docx.
+    Control characters XML can't carry (python-docx raised on them) are dropped."""
+    text = _XML_ILLEGAL.sub('', text)
+    if not _RUN_SPECIALS.search(text):
+        # the usual case: one stripped line from the markdown/kv splitters
+        if not text:
+            return ''
+        if text != text.strip():
+            return f'<w:t xml:space="preserve">{escape(text)}</w:t>'
+        return f'<w:t>{escape(text)}</w:t>'
+    out = []
+    for piece in _RUN_SPECIALS.split(text):
+        if not piece: continue
+        if piece == '\t':
+            out.append('<w:tab/>')
+        elif piece in ('\n', '\r'):
+            out.append('<w:br/>')
+        elif piece != piece.strip():
+            out.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+        else:
+            out.append(f'<w:t>{escape(piece)}</w:t>')
+    return ''.join(out)
+
+def format_run(text, bold=False, italic=False, size=11, color=None, is_devanagari=None):
+    """Returns a <w:r> with font, size, language settings, and bold/italic applied.
+    is_devanagari skips the script check when the caller already knows; None detects from text."""
     # Handle Hindi/Regional Fonts
-    if contains_devanagari(text):
-        run.font.name = FONT_HINDI
-        run._element.rPr.rFonts.set(qn('w:cs'), FONT_HINDI)
+    if is_devanagari is None:
+        is_devanagari = contains_devanagari(text)
+    return f'<w:r>{_run_props(bold, italic, size, color, is_devanagari)}{_text_xml(text)}</w:r>'
+
+@functools.lru_cache(maxsize=None)
+def _run_props(bold, italic, size, color, is_devanagari):
+    """<w:rPr> for a run; a report only uses a handful of combinations."""
+    if is_devanagari:
+        fonts = f'<w:rFonts w:ascii="{FONT_HINDI}" w:hAnsi="{FONT_HINDI}" w:cs="{FONT_HINDI}"/>'
     else:
-        run.font.name = FONT_ENGLISH
+        fonts = f'<w:rFonts w:ascii="{FONT_ENGLISH}" w:hAnsi="{FONT_ENGLISH}"/>'
+    b = '<w:b/>' if bold else '<w:b w:val="0"/>'
+    i = '<w:i/>' if italic else '<w:i w:val="0"/>'
+    c = f'<w:color w:val="{color}"/>' if color else ''
+    return f'<w:rPr>{fonts}{b}{i}{c}<w:sz w:val="{size * 2}"/></w:rPr>'
+
+def paragraph(runs='', ppr=None):
+    """Returns a <w:p>; ppr is the inner XML of its <w:pPr>, '' for an empty one."""
+    if ppr is not None:
+        runs = f'<w:pPr>{ppr}</w:pPr>' + runs if ppr else '<w:pPr/>' + runs
+    return f'<w:p>{runs}</w:p>' if runs else '<w:p/>'
 
-def process_markdown_content(doc, raw_text, base_indent=0):
+def process_markdown_content(out, raw_text, base_indent=0):
     """
-    Parses Markdown-like text and applies native Word formatting.
+    Parses Markdown-like text and appends native Word paragraphs to out.
     Handles:
     - Bullet points (* or -)
     - Bold text (**text**)
     - Headers (# or ##)
     """
-    lines = clean_text(raw_text).split('\n')
+    text = clean_text(raw_text)
+    # one scan for the block: if it has no Devanagari, no run does
+    deva = None if contains_devanagari(text) else False
+    lines = text.split('\n')
     
     for line in lines:
         line = line.strip()
         if not line: continue
 
-        # 1. Determine Paragraph Style
+        # 1. Determine Paragraph Style (heading / bullet prefix)
         style = 'Normal'
         indent = base_indent
         
-        # Heading detection
-        if line.startswith('# '):
-            style = 'Heading 3' # Map # to H3 for sizing reasons
-            line = line[2:]
-        elif line.startswith('## '):
-            style = 'Heading 4'
-            line = line[3:]
-        # Bullet detection
-        elif line.startswith('* ') or line.startswith('- '):
-            style = 'List Bullet'
-            line = line[2:]
-        elif line.startswith('• '):
-            style = 'List Bullet'
-            line = line[2:]
+        prefix = _LINE_STYLES.get(line[:2]) or _LINE_STYLES.get(line[:3])
+        if prefix:
+            style, cut = prefix
+            line = line[cut:]
         
-        # 2. Create Paragraph
-        p = doc.add_paragraph(style=style)
+        # 2. Paragraph properties
+        ppr = f'<w:pStyle w:val="{STYLE_IDS[style]}"/>' if style != 'Normal' else ''
         if indent > 0:
-            p.paragraph_format.left_indent = Inches(indent)
+            ppr += f'<w:ind w:left="{round(indent * 1440)}"/>'
         
         # 3. Parse Bold Markup (**text**)
         # This splits "A **bold** word" into ['A ', '**bold**', ' word']
-        parts = re.split(r'(\*\*.*?\*\*)', line)
+        parts = _BOLD_SPLIT.split(line)
+        runs = []
         
         for part in parts:
             if not part: continue
@@ -110,90 +185,95 @@ def process_markdown_content(doc, raw_text, base_indent=0):
                 is_bold_chunk = True
                 text_chunk = part[2:-2] # Remove **
             
-            # Add run to paragraph
-            run = p.add_run(text_chunk)
-            format_run(run, text_chunk, bold=is_bold_chunk, size=11)
+            runs.append(format_run(text_chunk, bold=is_bold_chunk, size=11, is_devanagari=deva))
+        out.append(paragraph(''.join(runs), ppr))
 
-def add_kv_section(doc, raw_text):
+def add_kv_section(out, raw_text):
     """Formatted User Input Context."""
-    lines = clean_text(raw_text).split('\n')
+    text = clean_text(raw_text)
+    deva = None if contains_devanagari(text) else False
+    lines = text.split('\n')
     for line in lines:
         line = line.strip()
         if not line: continue
         
-        p = doc.add_paragraph()
-        p.paragraph_format.space_after = Pt(2) 
-        
         if ':' in line:
             parts = line.split(':', 1)
             key, val = parts[0] + ":", parts[1]
             
-            # Key (Bold, Dark Gray)
-            run_k = p.add_run(key)
-            format_run(run_k, key, bold=True, size=10, color=RGBColor(60, 60, 60))
-            
-            # Value (Normal)
-            run_v = p.add_run(val)
-            format_run(run_v, val, bold=False, size=10)
+            # Key (Bold, Dark Gray), then Value (Normal)
+            runs = (format_run(key, bold=True, size=10, color=COLOR_KEY, is_devanagari=deva)
+                    + format_run(val, bold=False, size=10, is_devanagari=deva))
         else:
-            run = p.add_run(line)
-            format_run(run, line, size=10)
+            runs = format_run(line, size=10, is_devanagari=deva)
+        out.append(paragraph(runs, '<w:spacing w:after="40"/>'))
 
-def add_entry(doc, obj, idx):
-    # Create a solid line using a paragraph border logic is hard in python-docx, 
+def add_entry(out, obj, idx, block_width):
+    # Create a solid line using a paragraph border logic is hard in Word XML,
     # so we use a visual text separator or rely on page breaks.
     
-    table = doc.add_table(rows=1, cols=1)
-    table.autofit = True
-    cell = table.cell(0, 0)
-    # Add colored background logic if needed, but let's stick to text for stability
-    p = cell.paragraphs[0]
-    p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    run = p.add_run(f"SCENARIO RECORD #{idx} | ID: {obj.get('custom_id', 'N/A')}")
-    format_run(run, run.text, bold=True, size=14, color=RGBColor(0, 51, 102)) # Navy Blue
-    doc.add_paragraph() # Spacer
+    # Header card: one-cell table spanning the text block
+    header = format_run(f"SCENARIO RECORD #{idx} | ID: {obj.get('custom_id', 'N/A')}", bold=True, size=14, color=COLOR_RECORD)
+    out.append(
+        '<w:tbl><w:tblPr><w:tblW w:type="auto" w:w="0"/><w:tblLayout w:type="autofit"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr>'
+        f'<w:tblGrid><w:gridCol w:w="{block_width}"/></w:tblGrid>'
+        f'<w:tr><w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{block_width}"/></w:tcPr>{paragraph(header, _CENTER)}</w:tc></w:tr></w:tbl>'
+    )
+    out.append(paragraph()) # Spacer
 
 
     # SYSTEM INSTRUCTIONS (Footer/Meta)
-    doc.add_paragraph("_" * 90).alignment = WD_ALIGN_PARAGRAPH.CENTER # Thin separator
-    p_sys_head = doc.add_paragraph()
-    format_run(p_sys_head.add_run("System Instructions Used:"), "Sys", bold=True, size=10, color=RGBColor(100, 100, 100))
-    p_sys = doc.add_paragraph(clean_text(obj.get('system_instruction', '')))
-    for run in p_sys.runs:
-        format_run(run, run.text, size=10, italic=True, color=RGBColor(105,105,105))
+    out.append(_SEPARATOR) # Thin separator
+    out.append(paragraph(format_run("System Instructions Used:", bold=True, size=10, color=COLOR_HEADING)))
+    out.append(paragraph(format_run(clean_text(obj.get('system_instruction', '')), size=10, italic=True, color=COLOR_SYSTEM)))
 
     # 2. USER CONTEXT (Structured) 
-    h1 = doc.add_paragraph()
-    format_run(h1.add_run("USER INPUT CONTEXT"), "USER INPUT", bold=True, size=10, color=RGBColor(100, 100, 100))
-    # Apply shading or box logic here effectively creates a "card"
-    add_kv_section(doc, obj.get('prompt', ''))
-    doc.add_paragraph() 
+    out.append(paragraph(format_run("USER INPUT CONTEXT", bold=True, size=10, color=COLOR_HEADING)))
+    add_kv_section(out, obj.get('prompt', ''))
+    out.append(paragraph())
 
 
     # THOUGHTS (Internal Logic - Indented) 
     thoughts = obj.get('thoughts', '')
     if thoughts:
-        h3 = doc.add_paragraph()
-        format_run(h3.add_run("INTERNAL REASONING (Chain of Thought)"), "CoT", bold=True, size=10, color=RGBColor(200, 100, 0)) # Orange
+        out.append(paragraph(format_run("INTERNAL REASONING (Chain of Thought)", bold=True, size=10, color=COLOR_THOUGHTS)))
         
         # Pass indent=0.25 to indentation logic
-        process_markdown_content(doc, thoughts, base_indent=0.25)
+        process_markdown_content(out, thoughts, base_indent=0.25)
         
 
     # ADVISORY (The Core Result) 
-    h4 = doc.add_paragraph()
     # Green header for the solution
-    format_run(h4.add_run("GENERATED ADVISORY"), "ADVISORY", bold=True, size=10, color=RGBColor(0, 128, 0)) 
+    out.append(paragraph(format_run("GENERATED ADVISORY", bold=True, size=10, color=COLOR_ADVISORY)))
     
     # Use the intelligent Markdown parser here
-    process_markdown_content(doc, obj.get('advisory', ''))
-    doc.add_paragraph()
+    process_markdown_content(out, obj.get('advisory', ''))
+    out.append(paragraph())
 
 
     # Start new page for next entry
-    doc.add_page_break()
+    out.append(_PAGE_BREAK)
+
+def _render_chunk(args):
+    """Renders one chunk of consecutive entries; returns (entry count, document.xml bytes)."""
+    start, entries, block_width = args
+    out = []
+    for idx, obj in enumerate(entries, start):
+        add_entry(out, obj, idx, block_width)
+    return len(entries), ''.join(out).encode('utf-8')
+
+def create_docx(input_p, output_p, workers=1):
+    """
+    Writes the report body as raw WordprocessingML into an otherwise empty
+    python-docx document, streaming entries into word/document.xml.
+    With workers > 1, chunks of entries are rendered in a process pool and
+    written back in input order.
+    """
+    # python-docx is only needed for the template, so only import it here
+    from docx import Document
+    from docx.shared import Inches, Length
 
-def create_docx(input_p, output_p):
     doc = Document()
     
     # Set Narrow Margins for better fit (0.5 inches)
@@ -202,18 +282,83 @@ def create_docx(input_p, output_p):
     section.right_margin = Inches(0.7)
     section.top_margin = Inches(0.7)
     section.bottom_margin = Inches(0.7)
+    block_width = Length(section.page_width - section.left_margin - section.right_margin).twips
+
+    # the empty document is the template: styles, numbering and the section come from it
+    buf = io.BytesIO()
+    doc.save(buf)
+    template = zipfile.ZipFile(buf)
+    document_xml = template.read(DOCUMENT_XML).decode('utf-8')
+    body_start = document_xml.index('<w:body>') + len('<w:body>')
+    body_end = document_xml.index('<w:sectPr', body_start)
 
     print(f"Reading from: {input_p}")
     count = 0
-    for idx, obj in enumerate(iter_entries(input_p), 1): 
-        add_entry(doc, obj, idx)
-        count = idx
-        if idx % 100 == 0: print(f"Processed {idx} entries...")
+    with template, zipfile.ZipFile(output_p, 'w', compression=zipfile.ZIP_DEFLATED) as docx:
+        for item in template.infolist():
+            if item.filename != DOCUMENT_XML:
+                docx.writestr(item, template.read(item.filename))
+                continue
+            with docx.open(DOCUMENT_XML, 'w', force_zip64=True) as f:
+                f.write(document_xml[:body_end].encode('utf-8'))
+                for n, fragment in _iter_rendered(input_p, block_width, workers):
+                    f.write(fragment)
+                    # same progress lines as before chunking: one per 100 entries
+                    for done in range(count - count % 100 + 100, count + n + 1, 100):
+                        print(f"Processed {done} entries...")
+                    count += n
+                f.write(document_xml[body_end:].encode('utf-8'))
             
-    doc.save(output_p)
     print(f"DOCX Saved: {output_p} with {count} entries.")
 
+def _iter_rendered(input_p, block_width, workers):
+    """Yields (entry count, rendered bytes) per RENDER_CHUNK_ENTRIES entries, in input order."""
+    def chunks():
+        entries = iter_entries(input_p)
+        start = 1
+        while True:
+            chunk = list(itertools.islice(entries, RENDER_CHUNK_ENTRIES))
+            if not chunk:
+                return
+            yield start, chunk, block_width
+            start += len(chunk)
+
+    if workers <= 1:
+        yield from map(_render_chunk, chunks())
+        return
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        # a bounded window of chunks in flight; ex.map() would submit (and
+        # so read) every entry before the first fragment is written
+        pending = collections.deque()
+        for args in chunks():
+            pending.append(ex.submit(_render_chunk, args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _convert_with_libreoffice(docx_p, pdf_p):
+    """Headless LibreOffice conversion; returns False if soffice isn't installed."""
+    soffice = shutil.which("soffice") or shutil.which("libreoffice")
+    if not soffice:
+        return False
+    out_dir = os.path.dirname(os.path.abspath(pdf_p))
+    print(f"Converting to PDF with LibreOffice (headless)...")
+    subprocess.run([soffice, "--headless", "--convert-to", "pdf", "--outdir", out_dir, docx_p],
+                   check=True, stdout=subprocess.DEVNULL)
+    # soffice names the output after the input file
+    produced = os.path.join(out_dir, os.path.splitext(os.path.basename(docx_p))[0] + ".pdf")
+    if os.path.abspath(produced) != os.path.abspath(pdf_p):
+        os.replace(produced, pdf_p)
+    return True
+
 def convert_to_pdf(docx_p, pdf_p):
+    try:
+        if _convert_with_libreoffice(docx_p, pdf_p):
+            print(f"PDF Saved: {pdf_p}")
+            return
+    except Exception as e:
+        print(f"LibreOffice conversion failed, falling back to MS Word: {e}")
     try:
         from docx2pdf import convert
         print(f"Converting to PDF... (This uses MS Word, please wait)")
@@ -223,8 +368,15 @@ def convert_to_pdf(docx_p, pdf_p):
         print(f"Conversion Failed: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render parsed batch results into a DOCX/PDF report.")
+    parser.add_argument("input", help="parsed_results.jsonl or parsed_results.parquet")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes used to render entries (default: 1)")
+    args = parser.parse_args()
+    INPUT_PATH = os.path.abspath(args.input)
+
     if not os.path.exists(INPUT_PATH):
         print(f"Error: Input file not found at {INPUT_PATH}")
     else:
-        create_docx(INPUT_PATH, OUTPUT_DOCX)
+        create_docx(INPUT_PATH, OUTPUT_DOCX, workers=args.workers)
         convert_to_pdf(OUTPUT_DOCX, OUTPUT_PDF)
\ No newline at end of file
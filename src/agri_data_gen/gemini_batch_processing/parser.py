@@ -7,28 +7,63 @@ and writes a new JSONL,  and Parquet file with these fields per line.
 """
 
 
-import json
+import functools
 import os
 import re
-import pandas as pd
-import markdown
-import pdfkit  
+from itertools import zip_longest
 
-from agri_data_gen.gemini_batch_processing.create_pdf import create_docx, convert_to_pdf
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 
+# The report-only dependencies (markdown, weasyprint/pdfkit and
+# create_pdf's python-docx) are imported where they are used, so that
+# extract_fields and the JSONL/parquet helpers load without them.
 
+@functools.lru_cache(maxsize=None)
+def _markdown_renderer():
+	# one Python-Markdown instance, reset between documents, rather than
+	# building a new parser per call as markdown.markdown() does
+	import markdown
+	md = markdown.Markdown()
+	return lambda text: md.reset().convert(text)
+
+def render_markdown(text):
+	return _markdown_renderer()(text)
+
+
+# every column write_parquet emits; safe_str makes them all strings
+PARSED_SCHEMA = pa.schema([(name, pa.string()) for name in (
+	'custom_id', 'prompt', 'system_instruction', 'thoughts', 'advisory')])
+PARQUET_CHUNK_ROWS = 4096
+
+# what a JSON document can start with, after optional whitespace
+_JSON_START = re.compile(r'\s*(?:[{\["\d-]|true|false|null)')
+_CODE_FENCE = re.compile(r"```(?:\w+)?\n?(.*?)```", re.DOTALL)
 
 def read_jsonl(filepath):
-	with open(filepath, 'r', encoding='utf-8') as f:
-		return [json.loads(line) for line in f if line.strip()]
+	"""Yields one record per non-blank line, reading through a 64 KiB buffer."""
+	with open(filepath, 'rb', buffering=1 << 16) as f:
+		for line in f:
+			if line.strip():
+				yield orjson.loads(line)
 
 def write_jsonl(filepath, data):
-	with open(filepath, 'w', encoding='utf-8') as f:
+	with open(filepath, 'wb') as f:
 		for item in data:
-			f.write(json.dumps(item, ensure_ascii=False) + '\n')
+			f.write(orjson.dumps(item) + b'\n')
 
 def write_parquet(filepath, data):
-	pd.DataFrame(data).to_parquet(filepath, index=False)
+	"""Writes records to parquet in row groups of PARQUET_CHUNK_ROWS."""
+	with pq.ParquetWriter(filepath, PARSED_SCHEMA, compression='zstd') as writer:
+		chunk = []
+		for item in data:
+			chunk.append(item)
+			if len(chunk) == PARQUET_CHUNK_ROWS:
+				writer.write_table(pa.Table.from_pylist(chunk, schema=PARSED_SCHEMA))
+				chunk = []
+		if chunk:
+			writer.write_table(pa.Table.from_pylist(chunk, schema=PARSED_SCHEMA))
 
 def extract_prompt(batch_request):
 	req = batch_request.get('request', {})
@@ -47,68 +82,75 @@ def extract_system_instruction(batch_request):
 		return text.strip()
 	return ''
 
-def extract_thoughts(raw_result):
-	candidates = raw_result.get('response', {}).get('candidates', [])
-	for cand in candidates:
-		parts = cand.get('content', {}).get('parts', [])
-		for part in parts:
-			if isinstance(part, dict) and part.get('thought'):
-				return part.get('text', '').strip()
-	# fallback
-	if 'thoughts' in raw_result:
-		return str(raw_result['thoughts'])
-	return ''
-
-def extract_advisory(raw_result):
+def _decode_text(text):
+	if isinstance(text, bytes):
+		try:
+			return text.decode('utf-8')
+		except Exception:
+			return text.decode('latin-1', errors='replace')
+	return text
+
+def extract_thoughts_advisory(raw_result):
+	"""Returns (thoughts, advisory) from a single scan of the response candidates."""
+	thoughts = advisory = None
 	candidates = raw_result.get('response', {}).get('candidates', [])
 	for cand in candidates:
 		parts = cand.get('content', {}).get('parts', [])
 		for part in parts:
-			if isinstance(part, dict) and part.get('thought'):
+			if not isinstance(part, dict):
 				continue
-			if isinstance(part, dict) and 'text' in part:
-				text = part['text']
-				if isinstance(text, bytes):
-					try:
-						text = text.decode('utf-8')
-					except Exception:
-						text = text.decode('latin-1', errors='replace')
-				text = str(text).strip()
+			if part.get('thought'):
+				if thoughts is None:
+					thoughts = part.get('text', '').strip()
+			elif advisory is None and 'text' in part:
+				text = str(_decode_text(part['text'])).strip()
 				if text:
-					return text
-	# fallback
-	adv = raw_result.get('advisory')
-	if adv:
-		if isinstance(adv, list):
-			return '\n'.join(str(a) for a in adv)
-		if isinstance(adv, bytes):
-			try:
-				adv = adv.decode('utf-8')
-			except Exception:
-				adv = adv.decode('latin-1', errors='replace')
-		return str(adv)
-	return ''
+					advisory = text
+			if thoughts is not None and advisory is not None:
+				return thoughts, advisory
+
+	# fallbacks
+	if thoughts is None:
+		thoughts = str(raw_result['thoughts']) if 'thoughts' in raw_result else ''
+	if advisory is None:
+		adv = raw_result.get('advisory')
+		if not adv:
+			advisory = ''
+		elif isinstance(adv, list):
+			advisory = '\n'.join(str(a) for a in adv)
+		else:
+			advisory = str(_decode_text(adv))
+	return thoughts, advisory
+
+def extract_thoughts(raw_result):
+	return extract_thoughts_advisory(raw_result)[0]
+
+def extract_advisory(raw_result):
+	return extract_thoughts_advisory(raw_result)[1]
 
 def safe_str(val):
 	if val is None:
 		return ''
 	if isinstance(val, (dict, list)):
-		return json.dumps(val, ensure_ascii=False)
+		return orjson.dumps(val).decode()
 	return str(val)
 
 def extract_fields(batch_requests, raw_results):
-	"""Extract required fields from batch_requests and raw_results."""
-	output = []
-	for req, res in zip(batch_requests, raw_results):
-		entry = {
+	"""Extract required fields from batch_requests and raw_results, one pair at a time."""
+	count = 0
+	for req, res in zip_longest(batch_requests, raw_results):
+		if req is None or res is None:
+			print(f"Warning: batch_requests and raw_results have different lengths; stopped after {count} records.")
+			return
+		count += 1
+		thoughts, advisory = extract_thoughts_advisory(res)
+		yield {
 			'custom_id': safe_str(req.get('custom_id')),
 			'prompt': safe_str(extract_prompt(req)),
 			'system_instruction': safe_str(extract_system_instruction(req)),
-			'thoughts': safe_str(extract_thoughts(res)),
-			'advisory': safe_str(extract_advisory(res))
+			'thoughts': safe_str(thoughts),
+			'advisory': safe_str(advisory)
 		}
-		output.append(entry)
-	return output
 
 
 
@@ -121,10 +163,13 @@ def clean_and_parse_string(text):
     if not text:
         return ""
     
+    # 1. Plain text can't be JSON; skip the parse attempt and its exception
+    if isinstance(text, str) and not _JSON_START.match(text):
+        return text.replace('\n', '<br>')
 
     # 2. Check if it's actually valid JSON (common in Batch inputs)
     try:
-        data = json.loads(text)
+        data = orjson.loads(text)
         # If it parsed into a dict (e.g. prompt variables), format it nicely
         if isinstance(data, dict):
             formatted_lines = []
@@ -136,7 +181,7 @@ def clean_and_parse_string(text):
             return "<br>".join([str(x) for x in data])
         # If it was just a quoted string, return the inner string
         return str(data)
-    except (json.JSONDecodeError, TypeError):
+    except (orjson.JSONDecodeError, TypeError):
         # It's just regular text, but let's handle newlines for HTML
         return text.replace('\n', '<br>')
 
@@ -147,18 +192,18 @@ def clean_advisory_text(text):
     if not text: return "N/A"
     
     if "```" in text:
-        match = re.search(r"```(?:\w+)?\n?(.*?)```", text, re.DOTALL)
+        match = _CODE_FENCE.search(text)
         if match:
             text = match.group(1)
             
     try:
-        data = json.loads(text)
+        data = orjson.loads(text)
         if isinstance(data, dict):
             # If it has an 'advisory' key, return that
             if 'advisory' in data:
                 return str(data['advisory'])
             # Or just dump the whole dict if strictly JSON was requested
-            return json.dumps(data, ensure_ascii=False, indent=2)
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
     except:
         pass
         
@@ -168,28 +213,13 @@ def clean_advisory_text(text):
 
 def generate_styled_report(data, output_dir):
     """
-    Uses Pandas to process text and generates a high-quality HTML report.
+    Cleans and renders each record in one pass and generates a high-quality HTML report.
     """
-    print("Processing data with Pandas...")
-    
-    # 1. Load into Pandas
-    df = pd.DataFrame(data)
-
-    # 2. Clean Advisory & Thoughts (Remove wrappers, fix escapes)
-    df['advisory_clean'] = df['advisory'].apply(clean_advisory_text)
-    df['thoughts_clean'] = df['thoughts'].apply(clean_advisory_text) # Similar logic applies
-    
-    # 3. Convert to HTML (Markdown Parsing)
-    df['advisory_html'] = df['advisory_clean'].apply(lambda x: markdown.markdown(x))
-    df['thoughts_html'] = df['thoughts_clean'].apply(lambda x: markdown.markdown(x))
-    df['system_html'] = df['system_instruction'].apply(lambda x: markdown.markdown(x) if x else "N/A")
-
-    # 4. Clean Prompt (Parse JSON-strings into nice Key-Value lists)
-    # We use the smart parser here instead of just .replace
-    df['prompt_html'] = df['prompt'].apply(clean_and_parse_string)
+    print("Processing records...")
+    render_markdown = _markdown_renderer()
 
-    # 5. Construct the HTML Document
-    html_content = """
+    # Construct the HTML Document, streamed to disk one entry at a time
+    html_header = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -236,8 +266,18 @@ def generate_styled_report(data, output_dir):
             <p style="text-align:center; color:#666;">Generated via Gemini Batch API</p>
     """
 
-    for index, row in df.iterrows():
-        html_content += f"""
+    html_path = os.path.join(output_dir, 'parsed_results.html')
+    with open(html_path, "w", encoding="utf-8", buffering=1 << 16) as f:
+        f.write(html_header)
+        for row in data:
+            # Clean Advisory & Thoughts (Remove wrappers, fix escapes), then Markdown -> HTML
+            advisory_html = render_markdown(clean_advisory_text(row['advisory']))
+            thoughts_html = render_markdown(clean_advisory_text(row['thoughts'])) # Similar logic applies
+            system_html = render_markdown(row['system_instruction']) if row['system_instruction'] else "N/A"
+            # Clean Prompt (Parse JSON-strings into nice Key-Value lists)
+            prompt_html = clean_and_parse_string(row['prompt'])
+
+            f.write(f"""
         <div class="entry-card">
             <div class="meta-header">
                 <span><strong>ID:</strong> {row['custom_id']}</span>
@@ -245,42 +285,45 @@ def generate_styled_report(data, output_dir):
 
             <div class="section system-block">
                 <span class="label">System Role & Instructions:</span>
-                {row['system_html']}
+                {system_html}
             </div>
             
             <div class="section prompt-block">
                 <span class="label">User Input Context:</span>
-                <div class="content">{row['prompt_html']}</div>
+                <div class="content">{prompt_html}</div>
             </div>
 
             <div class="section advisory-block">
                 <span class="label">Generated Advisory:</span>
-                {row['advisory_html']}
+                {advisory_html}
             </div>
             
             <div class="section thoughts-block">
                 <span class="label">Internal Reasoning (CoT):</span>
-                {row['thoughts_html']}
+                {thoughts_html}
             </div>
         </div>
-        """
+        """)
 
-    html_content += "</div></body></html>"
+        f.write("</div></body></html>")
 
-    # Save HTML
-    html_path = os.path.join(output_dir, 'parsed_results.html')
-    with open(html_path, "w", encoding="utf-8") as f:
-        f.write(html_content)
-    
     print(f"HTML Report generated: {html_path}")
     
     # Convert to PDF
     pdf_path = os.path.join(output_dir, 'parsed_results.pdf')
     try:
-        print("Attempting to convert HTML to PDF via pdfkit...")
-        pdfkit.from_file(html_path, pdf_path)
+        # WeasyPrint renders in-process; pdfkit spawns wkhtmltopdf
+        try:
+            import weasyprint
+        except ImportError:
+            import pdfkit
+            print("Attempting to convert HTML to PDF via pdfkit...")
+            pdfkit.from_file(html_path, pdf_path)
+        else:
+            print("Converting HTML to PDF via WeasyPrint...")
+            weasyprint.HTML(html_path).write_pdf(pdf_path)
         print(f"- PDF Report generated: {pdf_path}")
-    except OSError as e:
+    except (OSError, ImportError) as e:
         print(f"- PDF Automation Skipped: {e}")
         print(f"- SOLUTION: Open '{html_path}' in Chrome/Safari and press Ctrl+P -> Save as PDF.")
 
@@ -293,13 +336,10 @@ def extract(raw_results_path, output_dir=None):
     
     os.makedirs(output_dir, exist_ok=True)
 
+    # both inputs are streamed; only the extracted fields are kept, for the report
     batch_requests = read_jsonl(os.path.join(os.path.dirname(raw_results_path), 'batch_requests.jsonl'))
     raw_results = read_jsonl(raw_results_path)
-	
-    if len(batch_requests) != len(raw_results):
-       print(f"Warning: batch_requests ({len(batch_requests)}) and raw_results ({len(raw_results)}) have different lengths.")
-    
-    parsed_data = extract_fields(batch_requests, raw_results)
+    parsed_data = list(extract_fields(batch_requests, raw_results))
 
     write_jsonl(os.path.join(output_dir, 'parsed_results.jsonl'), parsed_data)
     write_parquet(os.path.join(output_dir, 'parsed_results.parquet'), parsed_data)
@@ -308,6 +348,8 @@ def extract(raw_results_path, output_dir=None):
 
 
 if __name__ == '__main__':
+    from agri_data_gen.gemini_batch_processing.create_pdf import create_docx, convert_to_pdf
+
     path = "output/agri-advisory-job_1767082735/parsed_results-2.jsonl"
     INPUT_REL_PATH = "output/agri-advisory-job_1767082735/parsed_results.parquet"
 
@@ -1,5 +1,6 @@
 
 import os
+from concurrent.futures import ThreadPoolExecutor
 from google import genai
 from dotenv import load_dotenv
 
@@ -7,13 +8,19 @@ load_dotenv()
 client = genai.Client(api_key=os.getenv('GOOGLE_API_KEY_SOKET'))
 
 
-print("\nCleaning up ALL files from Gemini...")
-for f in client.files.list():
+def delete_file(f):
     try:
         client.files.delete(name=f.name)
         print(f"Deleted {f.name}")
     except Exception as e:
-        print(f"Could not delete {f.name}: {e}")        
+        print(f"Could not delete {f.name}: {e}")
+
+
+print("\nCleaning up ALL files from Gemini...")
+# each delete is its own HTTPS round trip, so run them concurrently
+files = list(client.files.list())
+with ThreadPoolExecutor(max_workers=32) as pool:
+    list(pool.map(delete_file, files))
         
 print("My files (after cleanup):")
 for f in client.files.list():
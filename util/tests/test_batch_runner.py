@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+
+from agri_data_gen.core.providers import batch_runner
+from agri_data_gen.core.providers.batch_runner import BatchRunner
+
+
+class FakeBatches:
+    """Each job reports RUNNING `polls` times before it succeeds."""
+
+    def __init__(self, polls):
+        self.polls = dict(polls)
+
+    async def get(self, name):
+        self.polls[name] -= 1
+        state = "JOB_STATE_SUCCEEDED" if self.polls[name] < 0 else "JOB_STATE_RUNNING"
+        return SimpleNamespace(state=SimpleNamespace(name=state),
+                               dest=SimpleNamespace(file_name=f"files/{name}"))
+
+
+class FakeFiles:
+    async def download(self, file, destination):
+        return None
+
+
+def test_grace_polling_per_run():
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+
+    batch_runner.asyncio.sleep = fake_sleep
+    batch_runner.random.uniform = lambda a, b: 0
+
+    batches = FakeBatches({"fast": 0, "slow": 5, "later": 5})
+    client = SimpleNamespace(aio=SimpleNamespace(batches=batches, files=FakeFiles()))
+    runner = BatchRunner(client, "model")
+
+    async def first_run():
+        grace = asyncio.Event()
+        await asyncio.gather(runner.wait("fast", "out_fast", "fast", grace),
+                             runner.wait("slow", "out_slow", "slow", grace))
+
+    asyncio.run(first_run())
+    print("First run sleeps:", sleeps)
+    # the slow job joins the fast one's run, so it polls at the grace cadence
+    assert sleeps == [BatchRunner.POLL_GRACE] * 5
+
+    sleeps.clear()
+
+    async def second_run():
+        await runner.wait("later", "out_later", "later", asyncio.Event())
+
+    asyncio.run(second_run())
+    print("Second run sleeps:", sleeps)
+    # a new run after a success starts from the backoff schedule again
+    expected = [min(BatchRunner.POLL_CAP, BatchRunner.POLL_BASE * 2 ** i) for i in range(5)]
+    assert sleeps == expected
+
+
+test_grace_polling_per_run()
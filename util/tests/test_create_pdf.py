@@ -0,0 +1,35 @@
+import json
+import os
+import tempfile
+import zipfile
+
+from lxml import etree
+
+from agri_data_gen.gemini_batch_processing.create_pdf import create_docx
+
+def test_create_docx_control_characters():
+    # LLM output occasionally carries control characters XML can't hold
+    record = {
+        "custom_id": "row_\x0b1",
+        "system_instruction": "Be concise.\x00",
+        "prompt": "Crop: Wheat\x0c\nStage: तना",
+        "thoughts": "- check **soil\x1b** moisture",
+        "advisory": "Irrigate\x0b now.\tनमस्ते",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "parsed_results.jsonl")
+        output_path = os.path.join(tmp, "report.docx")
+        with open(input_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        create_docx(input_path, output_path)
+
+        with zipfile.ZipFile(output_path) as docx:
+            root = etree.fromstring(docx.read("word/document.xml"))
+        text = "".join(root.itertext())
+        print("Document text:", text)
+        assert "Irrigate now." in text
+        assert "row_1" in text
+
+
+test_create_docx_control_characters()
@@ -0,0 +1,23 @@
+from agri_data_gen.core.data_access.taxonomy_manager import TaxonomyManager
+
+def test_cached_taxonomies_are_copies():
+    manager = TaxonomyManager()
+
+    taxonomies = manager.get_active_taxonomies()
+    print(f"Active taxonomies: {len(taxonomies)}")
+    first = taxonomies[0]
+    group, entry_count = first["group"], len(first["entries"])
+
+    # mutating what we were handed must not leak into the cache
+    first["entries"].clear()
+    first["group"] = "mutated"
+    again = manager.get_active_taxonomies()
+    assert again[0]["group"] == group
+    assert len(again[0]["entries"]) == entry_count
+
+    taxonomy = manager.get_taxonomy(group)
+    taxonomy["entries"].clear()
+    assert len(manager.get_entries(group)) == entry_count
+
+
+test_cached_taxonomies_are_copies()